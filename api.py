@@ -1,15 +1,51 @@
-from datetime import datetime, timedelta
+import base64
+import os
+import sys
+from datetime import datetime
+from functools import lru_cache
+from urllib.parse import urlencode
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify as flask_jsonify
+
+from metrics import metrics
+from persistence import restore
+from sqlite_store import SqliteStore
+from store import AppointmentNotFound, AppointmentOverlap, AppointmentStore, Occurrence, Recurrence, \
+    SERIALIZED_CACHE_SIZE, to_datetime, to_minutes, validate_recurrence
 
 app = Flask(__name__)
+jsonify = metrics.timed("jsonify")(flask_jsonify)
 
-appointments = []
-next_id = 1
 CATEGORY_TYPES = ["health", "general", "work", "social"]
 TIME_FORMAT = "%Y-%m-%d %H:%M"
+LIST_CACHE_SIZE = 64
+FORMAT_CACHE_SIZE = 64 * 1024
+BATCH_MODES = ["atomic", "partial"]
+NDJSON_MIMETYPE = "application/x-ndjson"
+# used when a cursor comes without a limit
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+DATA_DIR = os.environ.get("APPOINTMENTS_DATA_DIR")
+STORE_URL = os.environ.get("APPOINTMENTS_STORE", "memory")
+SQLITE_PREFIX = "sqlite:///"
+PROMETHEUS_MIMETYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# query string -> (etag, body, status, link) of the last rendered listing
+list_cache = {}
+
+
+def create_store(url):
+    if url == "memory":
+        return AppointmentStore()
+    if url.startswith(SQLITE_PREFIX):
+        return SqliteStore(url[len(SQLITE_PREFIX):])
+    raise ValueError(f"Invalid store {url!r}. Must be 'memory' or '{SQLITE_PREFIX}<path>'")
+
 
+appointments = create_store(STORE_URL)
 
+
+@metrics.timed("validate")
 def extract_and_validate_data_fields(json_data):
     validate_appointment(json_data)
 
@@ -19,14 +55,65 @@ def extract_and_validate_data_fields(json_data):
     category = json_data.get("category")
 
     validate_category_types(category)
-    start = datetime.strptime(start_str, TIME_FORMAT)
-    end = datetime.strptime(end_str, TIME_FORMAT)
+    start = parse_time(start_str)
+    end = parse_time(end_str)
 
     return title, start, end, category
 
 
+def extract_appointment(json_data):
+    # minutes and an optional recurrence on top of the validated fields
+    title, start, end, category = extract_and_validate_data_fields(json_data)
+    start, end = to_minutes(start), to_minutes(end)
+    return title, start, end, category, extract_recurrence(json_data, start, end)
+
+
+def extract_recurrence(json_data, start, end):
+    value = json_data.get("recurrence")
+    if value is None:
+        return None
+    if not isinstance(value, dict) or sorted(value) not in (["count", "frequency"], ["frequency", "until"]):
+        raise ValueError("Invalid recurrence: expected 'frequency' and either 'count' or 'until'")
+
+    count = value.get("count")
+    if count is not None and (type(count) is not int or count < 1):
+        raise ValueError("Invalid recurrence count. Must be a positive integer")
+    until = None
+    if "until" in value:
+        try:
+            until = to_minutes(parse_time(value["until"]))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid recurrence 'until'. Must match {TIME_FORMAT}")
+
+    recurrence = Recurrence(value["frequency"], count, until)
+    validate_recurrence(start, end, recurrence)
+    return recurrence
+
+
+def parse_time(value):
+    # fast path for the canonical "YYYY-MM-DD HH:MM" shape. fromisoformat accepts more spellings than
+    # TIME_FORMAT, so only that exact layout is handed to it; everything else, including impossible
+    # dates, goes through strptime so accepted inputs and error messages stay exactly the same
+    if isinstance(value, str) and len(value) == 16 and value.isascii() and value[4] == value[7] == "-" \
+            and value[10] == " " and value[13] == ":" and value[11:13] < "24":
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.strptime(value, TIME_FORMAT)
+
+
+@lru_cache(maxsize = FORMAT_CACHE_SIZE)
+def format_minutes(minutes):
+    value = to_datetime(minutes)
+    if value.year < 1000:
+        # strftime does not zero-pad years below 1000 on every platform, isoformat always does
+        return value.strftime(TIME_FORMAT)
+    return value.isoformat(" ", "minutes")
+
+
 def validate_appointment(json_data):
-    if ["category", "end", "start", "title"] != sorted(json_data.keys()):
+    if ["category", "end", "start", "title"] != sorted(key for key in json_data.keys() if key != "recurrence"):
         raise ValueError("Invalid appointment: wrong or missing fields")
 
 
@@ -35,122 +122,374 @@ def validate_category_types(category):
         raise ValueError(f"Invalid category. Must be one of {CATEGORY_TYPES}")
 
 
+def extract_time_window(args):
+    window = []
+    for name in ("from", "to"):
+        value = args.get(name)
+        if value is None:
+            window.append(None)
+            continue
+        try:
+            window.append(to_minutes(parse_time(value)))
+        except ValueError:
+            raise ValueError(f"Invalid '{name}' parameter. Must match {TIME_FORMAT}")
+
+    window_start, window_end = window
+    if window_start is not None and window_end is not None and window_start > window_end:
+        raise ValueError("Invalid time window: 'from' is after 'to'")
+    return window_start, window_end
+
+
 def serialize_datetime_format(appt):
-    return {
-        "id": appt["id"],
-        "title": appt["title"],
-        "start": appt["start"].strftime(TIME_FORMAT),
-        "end": appt["end"].strftime(TIME_FORMAT),
-        "category": appt["category"]
+    view = {
+        "id": appt.id,
+        "title": appt.title,
+        "start": format_minutes(appt.start),
+        "end": format_minutes(appt.end),
+        "category": appt.category
     }
+    if appt.recurrence is not None:
+        view["recurrence"] = serialize_recurrence(appt.recurrence)
+        if isinstance(appt, Occurrence):
+            view["occurrence"] = appt.index
+    return view
+
+
+def serialize_recurrence(recurrence):
+    if recurrence.count is not None:
+        return {"frequency": recurrence.frequency, "count": recurrence.count}
+    return {"frequency": recurrence.frequency, "until": format_minutes(recurrence.until)}
+
+
+def serialize_cached(appt, keep = True):
+    return appointments.serialized(appt, serialize_datetime_format, keep)
+
+
+def store_etag():
+    return f"{appointments.epoch}-{appointments.version}"
 
 
 @app.route("/appointments", methods = ["GET"])
 def list_appointments():
-    category_filter = request.args.get("category")
+    if wants_stream():
+        selected, cursor, error = select_appointments(request.args)
+        if error:
+            return jsonify(error[0]), error[1]
+        response = app.response_class(stream_appointments(selected), mimetype = NDJSON_MIMETYPE)
+        if cursor is not None:
+            response.headers["Link"] = next_page_link(request.path, request.args, cursor)
+        return response
+
+    etag = store_etag()
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status = 304)
+        response.set_etag(etag)
+        return response
+
+    cached = list_cache.get(request.query_string)
+    if cached is None or cached[0] != etag:
+        response, status, cursor = build_appointment_list(request.args)
+        link = None if cursor is None else next_page_link(request.path, request.args, cursor)
+        if len(list_cache) >= LIST_CACHE_SIZE:
+            list_cache.clear()
+        cached = list_cache[request.query_string] = (etag, response.get_data(), status, link)
+
+    response = app.response_class(cached[1], status = cached[2], mimetype = "application/json")
+    if cached[2] == 200:
+        response.set_etag(etag)
+    if cached[3] is not None:
+        response.headers["Link"] = cached[3]
+    return response
+
+
+def wants_stream():
+    if request.args.get("stream") in ("1", "true"):
+        return True
+    return request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def select_appointments(args):
+    # the selected appointments, the cursor of the next page (None without one) and an error
+    category_filter = args.get("category")
+    try:
+        window_start, window_end = extract_time_window(args)
+        windowed = window_start is not None or window_end is not None
+        limit, after = extract_page(args, windowed)
+    except ValueError as e:
+        return None, None, ({"error": str(e)}, 400)
 
     if category_filter:
         try:
             validate_category_types(category_filter)
         except ValueError as e:
-            return jsonify({"error": str(e)})
+            return None, None, ({"error": str(e)}, 200)
+
+    cursor = None
+    if limit is not None:
+        # one appointment more than asked for tells whether there is a next page
+        if windowed:
+            selected = appointments.query_page(window_start, window_end, after, limit + 1, category_filter or None)
+        else:
+            selected = appointments.id_page(after[0] if after else 0, limit + 1, category_filter or None)
+        if len(selected) > limit:
+            del selected[limit:]
+            last = selected[-1]
+            cursor = encode_cursor((last.start, last.id) if windowed else (last.id,))
+    elif windowed:
+        selected = appointments.query_range(window_start, window_end)
+    elif category_filter:
+        selected = list(appointments.by_category(category_filter))
+    else:
+        selected = list(appointments)
+
+    if category_filter:
+        selected = [appt for appt in selected if appt.category == category_filter]
+        if not selected and after is None:
+            return None, None, ({"error": "No appointments found for this category"}, 404)
+    return selected, cursor, None
+
+
+def extract_page(args, windowed):
+    # limit and (start, id) or (id,) key of a paged listing, (None, None) for a full one
+    limit, cursor = args.get("limit"), args.get("cursor")
+    if limit is None and cursor is None:
+        return None, None
+    if limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    elif not limit.isascii() or not limit.isdigit() or not 1 <= int(limit) <= MAX_PAGE_SIZE:
+        raise ValueError(f"Invalid 'limit' parameter. Must be an integer from 1 to {MAX_PAGE_SIZE}")
+    if cursor is None:
+        return int(limit), None
+
+    try:
+        key = tuple(map(int, base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(",")))
+    except ValueError:
+        raise ValueError("Invalid 'cursor' parameter")
+    # a cursor of a windowed listing does not fit a full one and vice versa; the keys are 64-bit
+    # integers in both stores
+    if len(key) != (2 if windowed else 1) or not all(-2 ** 63 <= value < 2 ** 63 for value in key):
+        raise ValueError("Invalid 'cursor' parameter")
+    return int(limit), key
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(",".join(map(str, key)).encode()).decode().rstrip("=")
+
+
+def next_page_link(path, args, cursor):
+    query = dict(args.items())
+    query["cursor"] = cursor
+    return f'<{path}?{urlencode(query)}>; rel="next"'
+
 
-        filtered = [serialize_datetime_format(appt) for appt in appointments if appt["category"] == category_filter]
+def build_appointment_list(args):
+    selected, cursor, error = select_appointments(args)
+    if error:
+        return jsonify(error[0]), error[1], None
+    # a listing larger than the view cache would only evict its own entries
+    keep = len(selected) <= SERIALIZED_CACHE_SIZE
+    with metrics.phase("serialize"):
+        serialized = [serialize_cached(appt, keep) for appt in selected]
+    return jsonify(serialized), 200, cursor
 
-        if not filtered:
-            return jsonify({"error": "No appointments found for this category"}), 404
-        return jsonify(filtered), 200
-    return jsonify([serialize_datetime_format(appt) for appt in appointments]), 200
+
+def stream_appointments(selected):
+    # the selection only holds references; serialized views are produced one line at a time
+    # and are not kept in the store cache, so a full export does not grow the process
+    for appt in selected:
+        yield app.json.dumps(appointments.serialized(appt, serialize_datetime_format, keep = False)) + "\n"
+
+
+@app.route("/metrics", methods = ["GET"])
+def show_metrics():
+    if not metrics.enabled:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    gauges = [
+        ("appointments_store_size", "Stored appointments", [({}, len(appointments))]),
+        ("appointments_store_category_size", "Stored appointments per category",
+         [({"category": category}, appointments.count(category)) for category in CATEGORY_TYPES]),
+        ("appointments_store_version", "Writes applied to the store", [({}, appointments.version)]),
+        ("appointments_list_cache_entries", "Cached listing responses", [({}, len(list_cache))]),
+        ("appointments_format_cache_entries", "Memoized timestamp strings",
+         [({}, format_minutes.cache_info().currsize)]),
+    ]
+    return app.response_class(metrics.render(gauges), content_type = PROMETHEUS_MIMETYPE)
+
+
+@app.before_request
+def start_request_metrics():
+    if metrics.enabled:
+        rule = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.begin(f"{request.method} {rule}")
+
+
+@app.teardown_request
+def finish_request_metrics(error = None):
+    metrics.end()
+
+
+@app.route("/appointments/counts", methods = ["GET"])
+def count_appointments():
+    return jsonify({category: appointments.count(category) for category in CATEGORY_TYPES}), 200
+
+
+@app.route("/appointments/free", methods = ["GET"])
+def list_free_slots():
+    payload, status = select_free_slots(request.args)
+    return jsonify(payload), status
+
+
+def select_free_slots(args):
+    try:
+        window_start, window_end = extract_time_window(args)
+        if window_start is None or window_end is None:
+            raise ValueError("Missing time window: 'from' and 'to' are required")
+        duration = extract_duration(args)
+        categories = None
+        if args.get("category"):
+            categories = args["category"].split(",")
+            for category in categories:
+                validate_category_types(category)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    slots = appointments.find_free_slots(window_start, window_end, duration, categories)
+    return [{"start": format_minutes(start), "end": format_minutes(end)} for start, end in slots], 200
+
+
+def extract_duration(args):
+    value = args.get("duration", "")
+    if not value.isascii() or not value.isdigit() or int(value) < 1:
+        raise ValueError("Invalid 'duration' parameter. Must be a positive number of minutes")
+    return int(value)
 
 
 @app.route("/appointments", methods = ["POST"])
 def create_appointment():
-    global next_id
     data = request.get_json()
     try:
-        title, start, end, category = extract_and_validate_data_fields(data)
+        title, start, end, category, recurrence = extract_appointment(data)
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
-    for appointment in appointments:
-        if end >= appointment["start"] and start <= appointment["end"]:
-            return jsonify({"error": "Overlapping appointment"}), 409
-
-    appointment = {
-        "id": next_id,
-        "title": title,
-        "start": start,
-        "end": end,
-        "category": category,
-    }
-    appointments.append(appointment)
-    next_id += 1
+    try:
+        appointment = appointments.create(title, start, end, category, recurrence)
+    except AppointmentOverlap:
+        return jsonify({"error": "Overlapping appointment"}), 409
     return jsonify(serialize_datetime_format(appointment)), 201
 
 
+@app.route("/appointments/batch", methods = ["POST"])
+def create_appointments_batch():
+    payload, status = create_batch(request.get_json(), request.args.get("mode", "atomic"))
+    return jsonify(payload), status
+
+
+def create_batch(data, mode):
+    if mode not in BATCH_MODES:
+        return {"error": f"Invalid mode. Must be one of {BATCH_MODES}"}, 400
+    if not isinstance(data, list):
+        return {"error": "Invalid batch: expected a list of appointments"}, 400
+
+    results = [None] * len(data)
+    positions = []
+    valid = []
+    for index, item in enumerate(data):
+        try:
+            valid.append(extract_appointment(item))
+        except Exception as e:
+            results[index] = {"status": 400, "error": str(e)}
+            continue
+        positions.append(index)
+
+    atomic = mode == "atomic"
+    if atomic and len(valid) != len(data):
+        conflicts, created = appointments.check_batch(valid), [None] * len(valid)
+    else:
+        conflicts, created = appointments.add_batch(valid, atomic = atomic)
+
+    for index, conflict, appt in zip(positions, conflicts, created):
+        if appt is not None:
+            results[index] = {"status": 201, "appointment": serialize_datetime_format(appt)}
+        elif conflict is None:
+            continue
+        elif conflict[0] == "store":
+            results[index] = {"status": 409, "error": "Overlapping appointment"}
+        else:
+            results[index] = {"status": 409, "error": "Overlapping appointment within batch"}
+
+    if atomic and any(appt is None for appt in created):
+        failed = [dict(result, index = index) for index, result in enumerate(results) if result is not None]
+        status = 400 if any(result["status"] == 400 for result in failed) else 409
+        return {"error": "Batch rejected", "items": failed}, status
+
+    if atomic:
+        return [result["appointment"] for result in results], 201
+    return results, 207
+
+
 @app.route("/appointments/<int:appt_id>", methods = ["PUT"])
 def update_appointment(appt_id):
     data = request.get_json()
     try:
-        title, start, end, category = extract_and_validate_data_fields(data)
+        title, start, end, category, recurrence = extract_appointment(data)
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
-    for appt in appointments:
-        if appt["id"] != appt_id and end >= appt["start"] and start <= appt["end"]:
-            return jsonify({"error": "Overlapping appointment"}), 409
-
-        if appt["id"] == appt_id:
-            appt["title"] = title
-            appt["start"] = start
-            appt["end"] = end
-            appt["category"] = category
-            return jsonify(serialize_datetime_format(appt)), 200
-
-    return jsonify({"error": "Appointment not found"}), 404
+    try:
+        appt = appointments.replace(appt_id, title, start, end, category, recurrence)
+    except AppointmentOverlap:
+        return jsonify({"error": "Overlapping appointment"}), 409
+    except AppointmentNotFound:
+        return jsonify({"error": "Appointment not found"}), 404
+    return jsonify(serialize_datetime_format(appt)), 200
 
 
 @app.route("/appointments/<int:appt_id>", methods = ["DELETE"])
 def delete_appointment(appt_id):
-    for appt in appointments:
-        if appt["id"] == appt_id:
-            appointments.remove(appt)
-            return jsonify({"status": "deleted"}), 200
-
-    return jsonify({"error": "Appointment not found"}), 404
+    if appointments.delete(appt_id) is None:
+        return jsonify({"error": "Appointment not found"}), 404
+    return jsonify({"status": "deleted"}), 200
 
 
 @app.route("/appointments/shift/<int:appt_id>", methods = ["POST"])
 def shift_appointment(appt_id):
-    amount_start = request.args.get("amount_start", "0")
-    amount_end = request.args.get("amount_end", "0")
-
     try:
-        shift_st = timedelta(days = float(amount_start))
-        shift_end = timedelta(days = float(amount_end))
-    except ValueError:
-        return jsonify({"error": "Invalid amount. Must be a number."}), 400
+        shift_st, shift_end = extract_shift_deltas(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    for appt in appointments:
-        if appt["id"] == appt_id:
-            new_start = appt["start"] + shift_st
-            new_end = appt["end"] + shift_end
+    try:
+        appt = appointments.shift(appt_id, shift_st, shift_end)
+    except AppointmentNotFound:
+        return jsonify({"error": "Appointment not found"}), 404
+    except AppointmentOverlap:
+        return jsonify({"error": "Shift would cause overlapping appointment"}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(serialize_datetime_format(appt)), 200
 
-            if new_start > new_end:
-                return jsonify({"error": "Shift would result in start after end"}), 400
 
-            for other in appointments:
-                if other["id"] != appt_id and new_end > other["start"] and new_start < other["end"]:
-                    return jsonify({"error": "Shift would cause overlapping appointment"}), 409
+def extract_shift_deltas(args):
+    # amounts are days; start and end are stored in whole minutes, so a shift is rounded to the nearest
+    # minute, the same way for earlier and later
+    try:
+        return tuple(round(float(args.get(name, "0")) * 24 * 60) for name in ("amount_start", "amount_end"))
+    except (ValueError, OverflowError):
+        raise ValueError("Invalid amount. Must be a number.")
 
-            appt["start"] = new_start
-            appt["end"] = new_end
-            return jsonify(serialize_datetime_format(appt)), 200
 
-    return jsonify({"error": "Appointment not found"}), 404
+app.config['app.json.sort_keys'] = False
 
+metrics.enabled = os.environ.get("APPOINTMENTS_METRICS") in ("1", "true")
+metrics.profile_dir = os.environ.get("APPOINTMENTS_PROFILE_DIR")
 
-app.config['app.json.sort_keys'] = False
+if DATA_DIR:
+    if not isinstance(appointments, AppointmentStore):
+        raise ValueError("APPOINTMENTS_DATA_DIR only applies to the memory store")
+    restored = restore(appointments, DATA_DIR)
+    print(f"Restored {restored['appointments']} appointments ({restored['replayed']} journal entries) "
+          f"from {DATA_DIR} in {restored['seconds'] * 1000:.0f} ms", file = sys.stderr)
 
 if __name__ == "__main__":  # pragma: no coverage
     app.run(debug = True)
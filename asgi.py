@@ -0,0 +1,244 @@
+import asyncio
+import json
+import re
+from urllib.parse import parse_qs
+
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+from api import app as flask_app, appointments, create_batch, extract_appointment, extract_shift_deltas, \
+    next_page_link, select_appointments, select_free_slots, serialize_cached, serialize_datetime_format, store_etag, \
+    CATEGORY_TYPES, NDJSON_MIMETYPE
+from store import AppointmentNotFound, AppointmentOverlap, SERIALIZED_CACHE_SIZE
+
+# Plain ASGI application with the same routes and JSON bodies as api.py, e.g. `uvicorn asgi:app`.
+# Store calls run in worker threads so the event loop only juggles connections; writes additionally
+# queue on one asyncio lock, reads run concurrently under the store's own read lock.
+
+STREAM_CHUNK = 1000
+
+write_lock = asyncio.Lock()
+
+
+class Request:
+
+    def __init__(self, scope, body):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.query_string = scope.get("query_string", b"")
+        self.args = {name: values[0] for name, values in parse_qs(self.query_string.decode()).items()}
+        self.headers = {name.decode("latin-1").lower(): value.decode("latin-1")
+                        for name, value in scope.get("headers", [])}
+        self.body = body
+        self.accept_mimetypes = parse_accept_header(self.headers.get("accept"), MIMEAccept)
+
+    def get_json(self):
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            raise ValueError("Invalid JSON body") from None
+
+
+async def read_store(function, *args, **kwargs):
+    return await asyncio.to_thread(function, *args, **kwargs)
+
+
+async def write_store(function, *args, **kwargs):
+    async with write_lock:
+        return await asyncio.to_thread(function, *args, **kwargs)
+
+
+async def list_appointments(request, send):
+    if wants_stream(request):
+        selected, cursor, error = await read_store(select_appointments, request.args)
+        if error:
+            return await send_json(send, *error)
+        return await stream_appointments(send, selected, page_headers(request, cursor))
+
+    etag = await read_store(store_etag)
+    if f'"{etag}"' in request.headers.get("if-none-match", ""):
+        return await send_response(send, 304, b"", [(b"etag", f'"{etag}"'.encode())])
+
+    payload, status, cursor = await read_store(build_appointment_list, request.args)
+    headers = [(b"content-type", b"application/json")] + page_headers(request, cursor)
+    if status == 200:
+        headers.append((b"etag", f'"{etag}"'.encode()))
+    await send_response(send, status, payload, headers)
+
+
+def build_appointment_list(args):
+    selected, cursor, error = select_appointments(args)
+    if error:
+        return flask_app.json.dumps(error[0]).encode(), error[1], None
+    keep = len(selected) <= SERIALIZED_CACHE_SIZE
+    return flask_app.json.dumps([serialize_cached(appt, keep) for appt in selected]).encode(), 200, cursor
+
+
+def page_headers(request, cursor):
+    if cursor is None:
+        return []
+    return [(b"link", next_page_link(request.path, request.args, cursor).encode())]
+
+
+def wants_stream(request):
+    if request.args.get("stream") in ("1", "true"):
+        return True
+    return request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+async def stream_appointments(send, selected, headers = ()):
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", NDJSON_MIMETYPE.encode()), *headers]})
+    for pos in range(0, len(selected), STREAM_CHUNK):
+        # serializing reads the store, so it runs in a worker thread like every other store call
+        body = await read_store(serialize_chunk, selected[pos:pos + STREAM_CHUNK])
+        # awaiting every chunk lets slow clients apply backpressure instead of buffering the export
+        await send({"type": "http.response.body", "body": body, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def serialize_chunk(appts):
+    return "".join(flask_app.json.dumps(appointments.serialized(appt, serialize_datetime_format, keep = False)) + "\n"
+                   for appt in appts).encode()
+
+
+async def count_appointments(request, send):
+    counts = await read_store(lambda: {category: appointments.count(category) for category in CATEGORY_TYPES})
+    await send_json(send, counts, 200)
+
+
+async def list_free_slots(request, send):
+    payload, status = await read_store(select_free_slots, request.args)
+    await send_json(send, payload, status)
+
+
+async def create_appointment(request, send):
+    try:
+        title, start, end, category, recurrence = extract_appointment(request.get_json())
+    except Exception as e:
+        return await send_json(send, {"error": str(e)}, 400)
+
+    try:
+        appointment = await write_store(appointments.create, title, start, end, category, recurrence)
+    except AppointmentOverlap:
+        return await send_json(send, {"error": "Overlapping appointment"}, 409)
+    await send_json(send, serialize_datetime_format(appointment), 201)
+
+
+async def create_appointments_batch(request, send):
+    try:
+        data = request.get_json()
+    except ValueError as e:
+        return await send_json(send, {"error": str(e)}, 400)
+
+    payload, status = await write_store(create_batch, data, request.args.get("mode", "atomic"))
+    await send_json(send, payload, status)
+
+
+async def update_appointment(request, send, appt_id):
+    try:
+        title, start, end, category, recurrence = extract_appointment(request.get_json())
+    except Exception as e:
+        return await send_json(send, {"error": str(e)}, 400)
+
+    try:
+        appt = await write_store(appointments.replace, appt_id, title, start, end, category, recurrence)
+    except AppointmentOverlap:
+        return await send_json(send, {"error": "Overlapping appointment"}, 409)
+    except AppointmentNotFound:
+        return await send_json(send, {"error": "Appointment not found"}, 404)
+    await send_json(send, serialize_datetime_format(appt), 200)
+
+
+async def delete_appointment(request, send, appt_id):
+    if await write_store(appointments.delete, appt_id) is None:
+        return await send_json(send, {"error": "Appointment not found"}, 404)
+    await send_json(send, {"status": "deleted"}, 200)
+
+
+async def shift_appointment(request, send, appt_id):
+    try:
+        shift_st, shift_end = extract_shift_deltas(request.args)
+    except ValueError as e:
+        return await send_json(send, {"error": str(e)}, 400)
+
+    try:
+        appt = await write_store(appointments.shift, appt_id, shift_st, shift_end)
+    except AppointmentNotFound:
+        return await send_json(send, {"error": "Appointment not found"}, 404)
+    except AppointmentOverlap:
+        return await send_json(send, {"error": "Shift would cause overlapping appointment"}, 409)
+    except ValueError as e:
+        return await send_json(send, {"error": str(e)}, 400)
+    await send_json(send, serialize_datetime_format(appt), 200)
+
+
+ROUTES = [
+    ("GET", re.compile(r"/appointments"), list_appointments),
+    ("GET", re.compile(r"/appointments/counts"), count_appointments),
+    ("GET", re.compile(r"/appointments/free"), list_free_slots),
+    ("POST", re.compile(r"/appointments"), create_appointment),
+    ("POST", re.compile(r"/appointments/batch"), create_appointments_batch),
+    ("PUT", re.compile(r"/appointments/(\d+)"), update_appointment),
+    ("DELETE", re.compile(r"/appointments/(\d+)"), delete_appointment),
+    ("POST", re.compile(r"/appointments/shift/(\d+)"), shift_appointment),
+]
+
+
+async def send_response(send, status, body, headers):
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, payload, status):
+    body = flask_app.json.dumps(payload).encode()
+    await send_response(send, status, body, [(b"content-type", b"application/json")])
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        raise ValueError(f"Unsupported scope type {scope['type']!r}")
+
+    body = await read_body(receive)
+    if body is None:
+        return
+    request = Request(scope, body)
+
+    path_matches = False
+    for method, pattern, handler in ROUTES:
+        match = pattern.fullmatch(request.path)
+        if match is None:
+            continue
+        path_matches = True
+        if method == request.method:
+            return await handler(request, send, *map(int, match.groups()))
+
+    if path_matches:
+        return await send_json(send, {"error": "Method not allowed"}, 405)
+    await send_json(send, {"error": "Not found"}, 404)
+
+
+app = application
@@ -0,0 +1,191 @@
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from api import app, appointments, format_minutes, list_cache, CATEGORY_TYPES
+from store import Appointment, to_minutes
+
+FIRST_START = datetime(2025, 1, 1, 8, 0)
+# seeded appointments take the first half of every hour, the created ones start after all of them
+SLOT = 60
+LENGTH = 30
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+METRICS = ["p50_ms", "p90_ms", "p99_ms", "max_ms", "throughput_rps"]
+
+
+def seed(count):
+    appointments.clear()
+    first = to_minutes(FIRST_START)
+    appointments.extend([Appointment(i + 1, f"Termin {i}", first + i * SLOT, first + i * SLOT + LENGTH,
+                                     CATEGORY_TYPES[i % len(CATEGORY_TYPES)]) for i in range(count)])
+    gc.collect()
+
+
+def slot_body(slot, title = "Benchmark"):
+    start = to_minutes(FIRST_START) + slot * SLOT
+    return {"title": title, "start": format_minutes(start), "end": format_minutes(start + LENGTH),
+            "category": "work"}
+
+
+def window(count):
+    # a window over the middle of the seeded range that holds about 50 appointments
+    middle = FIRST_START + timedelta(minutes = count // 2 * SLOT)
+    return (middle.strftime("%Y-%m-%d %H:%M"), (middle + timedelta(minutes = 50 * SLOT)).strftime("%Y-%m-%d %H:%M"))
+
+
+def scenarios(count):
+    window_start, window_end = window(count)
+    created = []
+    # shift moves a seeded appointment ten minutes into its free half hour and back again
+    shift = f"{10 / 1440}"
+
+    def create(client, i):
+        response = client.post("/appointments", json = slot_body(count + i))
+        created.append(response.json["id"])
+        return response
+
+    def delete(client, i):
+        return client.delete(f"/appointments/{created[i]}")
+
+    def cold(request):
+        # nothing is written between list requests, so without this every one would be a list_cache hit
+        def uncached(client, i):
+            list_cache.clear()
+            return request(client, i)
+        return uncached
+
+    def list_all(client, i):
+        return client.get("/appointments")
+
+    def list_filtered(client, i):
+        return client.get("/appointments", query_string = {"category": "work", "from": window_start, "to": window_end})
+
+    return [
+        ("list", 200, cold(list_all)),
+        ("list_cached", 200, list_all),
+        ("list_filtered", 200, cold(list_filtered)),
+        ("list_filtered_cached", 200, list_filtered),
+        ("create", 201, create),
+        ("create_conflict", 409, lambda client, i: client.post("/appointments", json = slot_body(i % count))),
+        ("update", 200, lambda client, i: client.put(f"/appointments/{i % count + 1}",
+                                                     json = slot_body(i % count, f"Termin {i}"))),
+        ("shift", 200, lambda client, i: client.post(f"/appointments/shift/{count // 2}", query_string = {
+            "amount_start": shift if i % 2 == 0 else f"-{shift}",
+            "amount_end": shift if i % 2 == 0 else f"-{shift}"})),
+        ("delete", 200, delete),
+    ]
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run_scenario(client, request, expected_status, requests, warmup):
+    latencies = []
+    started = time.perf_counter()
+    for i in range(warmup + requests):
+        before = time.perf_counter()
+        response = request(client, i)
+        elapsed = time.perf_counter() - before
+        if response.status_code != expected_status:
+            raise RuntimeError(f"unexpected status {response.status_code}: {response.get_data(as_text = True)}")
+        if i == warmup - 1:
+            started = time.perf_counter()
+        if i >= warmup:
+            latencies.append(elapsed)
+    total = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p90_ms": percentile(latencies, 0.90) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "throughput_rps": requests / total,
+    }
+
+
+def run(sizes, requests, warmup):
+    client = app.test_client()
+    results = {}
+    for count in sizes:
+        seed(count)
+        results[str(count)] = size_results = {}
+        for name, expected_status, request in scenarios(count):
+            # create runs warmup + requests times, so delete has the same number of ids to remove
+            size_results[name] = run_scenario(client, request, expected_status, requests, warmup)
+            print(f"{count:>9} {name:20} p50 {size_results[name]['p50_ms']:9.3f} ms  "
+                  f"p99 {size_results[name]['p99_ms']:9.3f} ms  "
+                  f"{size_results[name]['throughput_rps']:9.0f} req/s", file = sys.stderr)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output = True, text = True,
+                              check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, results, metric, threshold):
+    # higher is better for throughput, lower for every latency metric
+    regressions = []
+    for count, routes in results.items():
+        for name, current in routes.items():
+            previous = baseline.get("results", {}).get(count, {}).get(name)
+            if previous is None:
+                continue
+            if metric == "throughput_rps":
+                change = (previous[metric] - current[metric]) / previous[metric] * 100
+            else:
+                change = (current[metric] - previous[metric]) / previous[metric] * 100
+            if change > threshold:
+                regressions.append((count, name, previous[metric], current[metric], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Latency and throughput of every endpoint per store size")
+    parser.add_argument("--sizes", type = lambda value: [int(size) for size in value.split(",")], default = SIZES)
+    parser.add_argument("--requests", type = int, default = 200)
+    parser.add_argument("--warmup", type = int, default = 10)
+    parser.add_argument("--output", help = "write the results as JSON to this file")
+    parser.add_argument("--baseline", help = "JSON results of an earlier run to compare against")
+    parser.add_argument("--metric", choices = METRICS, default = "p50_ms")
+    parser.add_argument("--threshold", type = float, default = 20.0,
+                        help = "fail when the metric is worse than the baseline by more than this many percent")
+    args = parser.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "store": type(appointments).__name__,
+        "requests": args.requests,
+        "results": run(args.sizes, args.requests, args.warmup),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent = 2)
+    else:
+        print(json.dumps(report, indent = 2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report["results"], args.metric, args.threshold)
+        for count, name, previous, current, change in regressions:
+            print(f"REGRESSION {count:>9} {name:20} {args.metric} {previous:.3f} -> {current:.3f} (+{change:.0f}%)",
+                  file = sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":  # pragma: no coverage
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import timeit
+from datetime import datetime, timedelta
+
+from api import FORMAT_CACHE_SIZE, TIME_FORMAT, format_minutes, parse_time
+from store import to_datetime, to_minutes
+
+FIRST_START = datetime(2025, 1, 1, 8, 0)
+
+
+def sample_values(count):
+    return [(FIRST_START + timedelta(minutes = 30 * i)).strftime(TIME_FORMAT) for i in range(count)]
+
+
+def strptime_parse(values):
+    for value in values:
+        datetime.strptime(value, TIME_FORMAT)
+
+
+def fast_parse(values):
+    for value in values:
+        parse_time(value)
+
+
+def strftime_format(minutes):
+    for value in minutes:
+        to_datetime(value).strftime(TIME_FORMAT)
+
+
+def fast_format(minutes):
+    for value in minutes:
+        format_minutes(value)
+
+
+def measure(function, values, repeat):
+    return min(timeit.repeat(lambda: function(values), number = 1, repeat = repeat)) / len(values) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Parsing and formatting cost per timestamp, old and new code")
+    # half the memo size: a listing formats a start and an end per appointment
+    parser.add_argument("--count", type = int, default = FORMAT_CACHE_SIZE // 2)
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args()
+
+    values = sample_values(args.count)
+    minutes = [to_minutes(parse_time(value)) for value in values]
+    # a listing formats the same timestamps on every request, so the formatter runs warm; more
+    # timestamps than the memo holds would evict each other, so the warm run uses the ones that fit
+    warm = minutes[:FORMAT_CACHE_SIZE]
+    fast_format(warm)
+
+    print(f"timestamps: {args.count}, warm format_minutes: {len(warm)}")
+    for label, function, data in (("datetime.strptime (before)", strptime_parse, values),
+                                  ("parse_time (after)", fast_parse, values),
+                                  ("datetime.strftime (before)", strftime_format, minutes),
+                                  ("format_minutes (after)", fast_format, warm)):
+        print(f"{label:28} {measure(function, data, args.repeat):8.0f} ns/timestamp")
+
+
+if __name__ == "__main__":  # pragma: no coverage
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import gc
+import tracemalloc
+from datetime import datetime, timedelta
+
+from api import CATEGORY_TYPES, serialize_datetime_format
+from store import Appointment, AppointmentStore, to_minutes
+
+FIRST_START = datetime(2025, 1, 1, 8, 0)
+
+
+def dict_records(count):
+    records = []
+    for i in range(count):
+        start = FIRST_START + timedelta(hours = i)
+        records.append({
+            "id": i + 1,
+            "title": f"Termin {i}",
+            "start": start,
+            "end": start + timedelta(minutes = 30),
+            "category": CATEGORY_TYPES[i % len(CATEGORY_TYPES)],
+        })
+    return records
+
+
+def compact_records(count):
+    first = to_minutes(FIRST_START)
+    return [Appointment(i + 1, f"Termin {i}", first + i * 60, first + i * 60 + 30, CATEGORY_TYPES[i % 4])
+            for i in range(count)]
+
+
+def indexed_store(count):
+    store = AppointmentStore()
+    store.extend(compact_records(count))
+    # the serialized view cache grows with listings, so it is part of what a running store holds
+    for appt in store:
+        store.serialized(appt, serialize_datetime_format)
+    return store
+
+
+def measure(build, count):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build(count)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del result
+    return used / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Memory per appointment for the record layouts")
+    parser.add_argument("--count", type = int, default = 1_000_000)
+    args = parser.parse_args()
+
+    print(f"appointments: {args.count}")
+    for label, build in (("dict + datetime (before)", dict_records),
+                         ("Appointment __slots__ (after)", compact_records),
+                         ("AppointmentStore incl. indexes + view cache", indexed_store)):
+        print(f"{label:44} {measure(build, args.count):8.1f} bytes/appointment")
+
+
+if __name__ == "__main__":  # pragma: no coverage
+    main()
@@ -0,0 +1,88 @@
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+
+class ReadWriteLock:
+    # Many readers or one writer. Waiting writers block new readers so writes are not starved.
+    # The writing thread may re-enter as writer or reader, a reading thread may re-enter as reader.
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._waiting_writers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def reading(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            yield
+            return
+
+        depth = getattr(self._local, "depth", 0)
+        if not depth:
+            with self._cond:
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+                self._readers += 1
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            if not depth:
+                with self._cond:
+                    self._readers -= 1
+                    if not self._readers:
+                        self._cond.notify_all()
+
+    @contextmanager
+    def writing(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            self._writer_depth += 1
+            try:
+                yield
+            finally:
+                self._writer_depth -= 1
+            return
+
+        if getattr(self._local, "depth", 0):
+            raise RuntimeError("cannot upgrade a read lock to a write lock")
+
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer_depth -= 1
+                self._writer = None
+                self._cond.notify_all()
+
+    def is_writing(self):
+        return self._writer == threading.get_ident()
+
+
+def reads(method):
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock.reading():
+            return method(self, *args, **kwargs)
+    return locked
+
+
+def writes(method):
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.transaction():
+            return method(self, *args, **kwargs)
+    return locked
@@ -0,0 +1,165 @@
+import cProfile
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+# upper bounds in seconds, Prometheus adds the +Inf bucket
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PROFILE_KEEP = 5
+PROFILE_EVERY = 100
+
+
+class Histogram:
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class Metrics:
+    # Request and phase latencies, recorded only while enabled. Phases are attributed to the route
+    # of the request running on the current thread; the profiler samples every profile_every-th
+    # request and keeps the cProfile dumps of the PROFILE_KEEP slowest ones in profile_dir.
+
+    def __init__(self, enabled = False, profile_dir = None, profile_every = PROFILE_EVERY):
+        self.enabled = enabled
+        self.profile_dir = profile_dir
+        self.profile_every = profile_every
+        self.requests = {}
+        self.phases = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._requests_seen = itertools.count()
+        self._sequence = itertools.count()
+        self._slowest = []
+
+    def begin(self, route):
+        self._local.route = route
+        self._local.profiler = None
+        if self.profile_dir and next(self._requests_seen) % self.profile_every == 0:
+            self._local.profiler = cProfile.Profile()
+            self._local.profiler.enable()
+        self._local.started = time.perf_counter()
+
+    def end(self):
+        route = getattr(self._local, "route", None)
+        if route is None:
+            return
+        elapsed = time.perf_counter() - self._local.started
+        self._local.route = None
+        profiler = self._local.profiler
+        if profiler is not None:
+            profiler.disable()
+            self._keep_profile(route, elapsed, profiler)
+        self.observe(self.requests, (route,), elapsed)
+
+    def observe(self, table, labels, seconds):
+        with self._lock:
+            histogram = table.get(labels)
+            if histogram is None:
+                histogram = table[labels] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(self.phases, (self.current_route(), name), time.perf_counter() - started)
+
+    def timed(self, name):
+        def decorate(function):
+            @wraps(function)
+            def timed_call(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(self.phases, (self.current_route(), name), time.perf_counter() - started)
+            return timed_call
+        return decorate
+
+    def current_route(self):
+        return getattr(self._local, "route", None) or "none"
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+            self.phases.clear()
+            self._slowest.clear()
+
+    def render(self, gauges = ()):
+        # gauges are (name, help, [(labels, value), ...]) triples
+        lines = []
+        with self._lock:
+            render_histograms(lines, "appointments_request_seconds", "Request latency by route",
+                              ("route",), self.requests)
+            render_histograms(lines, "appointments_phase_seconds", "Latency of request phases by route",
+                              ("route", "phase"), self.phases)
+        for name, help_text, samples in gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                lines.append(f"{name}{format_labels(labels.items())} {value}")
+        return "\n".join(lines) + "\n"
+
+    def slowest_profiles(self):
+        with self._lock:
+            return [path for _, _, path in sorted(self._slowest, reverse = True)]
+
+    def _keep_profile(self, route, seconds, profiler):
+        with self._lock:
+            if len(self._slowest) >= PROFILE_KEEP and seconds <= self._slowest[0][0]:
+                return
+            sequence = next(self._sequence)
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_")
+            path = os.path.join(self.profile_dir, f"{slug}-{seconds * 1000:.1f}ms-{sequence}.prof")
+            os.makedirs(self.profile_dir, exist_ok = True)
+            profiler.dump_stats(path)
+            if len(self._slowest) >= PROFILE_KEEP:
+                _, _, evicted = heapq.heapreplace(self._slowest, (seconds, sequence, path))
+                os.remove(evicted)
+            else:
+                heapq.heappush(self._slowest, (seconds, sequence, path))
+
+
+def render_histograms(lines, name, help_text, label_names, table):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, histogram in sorted(table.items()):
+        pairs = list(zip(label_names, labels))
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{format_labels(pairs + [('le', str(bound))])} {cumulative}")
+        lines.append(f"{name}_sum{format_labels(pairs)} {histogram.sum}")
+        lines.append(f"{name}_count{format_labels(pairs)} {histogram.count}")
+
+
+def format_labels(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+metrics = Metrics()
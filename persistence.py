@@ -0,0 +1,226 @@
+import gc
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from itertools import accumulate
+
+from store import Appointment, Recurrence
+
+SNAPSHOT_MAGIC = b"APPTSNP1"
+SNAPSHOT_HEADER = struct.Struct("<qqI")
+JOURNAL_NAME = "journal.ndjson"
+SNAPSHOT_NAME = "snapshot.bin"
+COMPACT_BYTES = 64 * 1024 * 1024
+
+
+class Journal:
+    # Write-ahead log with group commit: every writer flushes its entry and then waits in sync() for
+    # an fsync that covers it. Whoever gets the sync lock first syncs for everyone queued behind it.
+
+    def __init__(self, data_dir, compact_bytes = COMPACT_BYTES):
+        self.path = os.path.join(data_dir, JOURNAL_NAME)
+        self.snapshot_path = os.path.join(data_dir, SNAPSHOT_NAME)
+        self.compact_bytes = compact_bytes
+        self._file = open(self.path, "ab")
+        self._write_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._written = 0
+        self._synced = 0
+
+    def append(self, op, appts = ()):
+        if op == "put":
+            lines = [encode_put(appt) for appt in appts]
+        elif op == "delete":
+            lines = [json.dumps({"op": "delete", "id": appt.id}).encode() + b"\n" for appt in appts]
+        else:
+            lines = [json.dumps({"op": op}).encode() + b"\n"]
+
+        with self._write_lock:
+            self._file.write(b"".join(lines))
+            self._file.flush()
+            self._written += 1
+            return self._written
+
+    def needs_compaction(self):
+        return self._file.tell() >= self.compact_bytes
+
+    def compact(self, store):
+        # callers must keep writers out while the snapshot is taken
+        with self._write_lock:
+            write_snapshot(store, self.snapshot_path)
+            self._file.truncate(0)
+            self._file.seek(0)
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+    def sync(self, seq):
+        with self._sync_lock:
+            if self._synced >= seq:
+                return
+            covered = self._written
+            os.fsync(self._file.fileno())
+            self._synced = covered
+
+
+def encode_put(appt):
+    entry = {"op": "put", "id": appt.id, "title": appt.title, "start": appt.start, "end": appt.end,
+             "category": appt.category}
+    if appt.recurrence is not None:
+        entry["recurrence"] = list(appt.recurrence)
+    return json.dumps(entry).encode() + b"\n"
+
+
+def decode_recurrence(value):
+    return None if value is None else Recurrence(*value)
+
+
+def write_snapshot(store, path):
+    appts = list(store)
+    categories = sorted({appt.category for appt in appts})
+    codes = {category: code for code, category in enumerate(categories)}
+    titles = [appt.title if type(appt.title) is str else "" for appt in appts]
+    title_blob = "".join(titles).encode("utf-8", "surrogatepass")
+    # recurring appointments and titles that are not strings (the API takes any JSON value) are rare,
+    # they go into small JSON sections keyed by position
+    recurrences = json.dumps([[pos, *appt.recurrence] for pos, appt in enumerate(appts)
+                              if appt.recurrence is not None]).encode()
+    other_titles = json.dumps([[pos, appt.title] for pos, appt in enumerate(appts)
+                               if type(appt.title) is not str]).encode()
+
+    columns = [
+        array("q", (appt.id for appt in appts)),
+        array("q", (appt.start for appt in appts)),
+        array("q", (appt.end for appt in appts)),
+        array("H", (codes[appt.category] for appt in appts)),
+        array("I", (len(title) for title in titles)),
+    ]
+    if sys.byteorder == "big":
+        for column in columns:
+            column.byteswap()
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(SNAPSHOT_HEADER.pack(store.next_id, len(appts), len(categories)))
+        for category in categories:
+            encoded = category.encode()
+            f.write(struct.pack("<H", len(encoded)) + encoded)
+        for column in columns:
+            f.write(column.tobytes())
+        f.write(struct.pack("<q", len(title_blob)))
+        f.write(title_blob)
+        for section in (recurrences, other_titles):
+            f.write(struct.pack("<q", len(section)))
+            f.write(section)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path):
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+        magic = mm[:len(SNAPSHOT_MAGIC)]
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"Invalid snapshot file {path}")
+        offset = len(SNAPSHOT_MAGIC)
+        next_id, count, category_count = SNAPSHOT_HEADER.unpack_from(mm, offset)
+        offset += SNAPSHOT_HEADER.size
+
+        categories = []
+        for _ in range(category_count):
+            (length,) = struct.unpack_from("<H", mm, offset)
+            categories.append(mm[offset + 2:offset + 2 + length].decode())
+            offset += 2 + length
+
+        view = memoryview(mm)
+        columns = []
+        for typecode in ("q", "q", "q", "H", "I"):
+            column = array(typecode)
+            size = column.itemsize * count
+            column.frombytes(view[offset:offset + size])
+            if sys.byteorder == "big":
+                column.byteswap()
+            columns.append(column)
+            offset += size
+        (blob_size,) = struct.unpack_from("<q", mm, offset)
+        offset += 8
+        titles = bytes(view[offset:offset + blob_size]).decode("utf-8", "surrogatepass")
+        offset += blob_size
+        sections = []
+        for _ in range(2):
+            (section_size,) = struct.unpack_from("<q", mm, offset)
+            sections.append(json.loads(bytes(view[offset + 8:offset + 8 + section_size])))
+            offset += 8 + section_size
+        view.release()
+    recurrences, other_titles = sections
+
+    ids, starts, ends, codes, title_lengths = columns
+    bounds = list(accumulate(title_lengths, initial = 0))
+    titles = [titles[lo:hi] for lo, hi in zip(bounds, bounds[1:])]
+    appts = list(map(Appointment, ids, titles, starts, ends, map(categories.__getitem__, codes)))
+    for pos, *recurrence in recurrences:
+        appts[pos].recurrence = Recurrence(*recurrence)
+    for pos, title in other_titles:
+        appts[pos].title = title
+    return next_id, appts
+
+
+def replay_journal(store, path):
+    replayed = 0
+    valid_bytes = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            if entry["op"] == "put":
+                store.put(Appointment(entry["id"], entry["title"], entry["start"], entry["end"], entry["category"],
+                                      decode_recurrence(entry.get("recurrence"))))
+            elif entry["op"] == "delete":
+                store.delete(entry["id"])
+            elif entry["op"] == "clear":
+                store.clear()
+            replayed += 1
+            valid_bytes += len(line)
+
+    # drop a torn tail left by a crash in the middle of a write
+    if valid_bytes != os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(valid_bytes)
+    return replayed
+
+
+def restore(store, data_dir, compact_bytes = COMPACT_BYTES):
+    started = time.perf_counter()
+    os.makedirs(data_dir, exist_ok = True)
+
+    snapshot_path = os.path.join(data_dir, SNAPSHOT_NAME)
+    journal_path = os.path.join(data_dir, JOURNAL_NAME)
+
+    store.journal = None
+    store.clear()
+    # restoring allocates millions of acyclic objects, collector passes over them are pure overhead
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        if os.path.exists(snapshot_path):
+            next_id, appts = load_snapshot(snapshot_path)
+            store.extend(appts)
+            store.next_id = next_id
+        replayed = replay_journal(store, journal_path) if os.path.exists(journal_path) else 0
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    store.journal = Journal(data_dir, compact_bytes)
+
+    return {"appointments": len(store), "replayed": replayed, "seconds": time.perf_counter() - started}
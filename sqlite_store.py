@@ -0,0 +1,246 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from uuid import uuid4
+
+from store import Appointment, AppointmentBackend, Recurrence, validate_minutes
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS appointments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title,
+    starts_at INTEGER NOT NULL,
+    ends_at INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    frequency TEXT,
+    repeat_count INTEGER,
+    repeat_until INTEGER
+);
+CREATE INDEX IF NOT EXISTS appointments_span ON appointments (starts_at, ends_at);
+CREATE INDEX IF NOT EXISTS appointments_category ON appointments (category, id);
+CREATE INDEX IF NOT EXISTS appointments_duration ON appointments (ends_at - starts_at);
+CREATE INDEX IF NOT EXISTS appointments_series ON appointments (id) WHERE frequency IS NOT NULL;
+CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value NOT NULL);
+"""
+COLUMNS = "id, title, starts_at, ends_at, category, frequency, repeat_count, repeat_until"
+BUSY_TIMEOUT = 30
+
+
+def row_to_appointment(row):
+    appt_id, title, start, end, category, frequency, count, until = row
+    recurrence = None if frequency is None else Recurrence(frequency, count, until)
+    return Appointment(appt_id, decode_title(title), start, end, category, recurrence)
+
+
+def appointment_to_row(appt):
+    recurrence = appt.recurrence or (None, None, None)
+    return (appt.id, encode_title(appt.title), appt.start, appt.end, appt.category) + tuple(recurrence)
+
+
+def encode_title(title):
+    # the API takes any JSON value as title; strings and null are stored as they are, everything
+    # else as a JSON blob so numbers, booleans and containers come back with their type
+    if title is None or type(title) is str:
+        return title
+    return json.dumps(title).encode()
+
+
+def decode_title(title):
+    return json.loads(title) if type(title) is bytes else title
+
+
+class SqliteStore(AppointmentBackend):
+    # Shares one database file between threads and worker processes. Every thread of every process
+    # gets its own connection; writes run in BEGIN IMMEDIATE transactions, so the conflict check and
+    # the insert see the same state, and WAL keeps readers going while a write is in progress.
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT OR IGNORE INTO store_meta VALUES ('version', 0)")
+        conn.execute("INSERT OR IGNORE INTO store_meta VALUES ('epoch', ?)", (uuid4().hex[:12],))
+        self.epoch = conn.execute("SELECT value FROM store_meta WHERE key = 'epoch'").fetchone()[0]
+
+    @property
+    def version(self):
+        return self._connection().execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()[0]
+
+    @property
+    def next_id(self):
+        row = self._connection().execute("SELECT seq FROM sqlite_sequence WHERE name = 'appointments'").fetchone()
+        return (row[0] if row else 0) + 1
+
+    @contextmanager
+    def transaction(self):
+        conn = self._connection()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth = 0
+            conn.execute("ROLLBACK")
+            raise
+        self._local.depth = 0
+        conn.execute("COMMIT")
+
+    def __iter__(self):
+        return map(row_to_appointment, self._connection().execute(f"SELECT {COLUMNS} FROM appointments ORDER BY id"))
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM appointments").fetchone()[0]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        row = None
+        if index >= 0:
+            row = self._connection().execute(f"SELECT {COLUMNS} FROM appointments ORDER BY id LIMIT 1 OFFSET ?",
+                                             (index,)).fetchone()
+        if row is None:
+            raise IndexError("appointment index out of range")
+        return row_to_appointment(row)
+
+    def get(self, appt_id):
+        row = self._connection().execute(f"SELECT {COLUMNS} FROM appointments WHERE id = ?", (appt_id,)).fetchone()
+        return None if row is None else row_to_appointment(row)
+
+    def by_category(self, category):
+        rows = self._connection().execute(f"SELECT {COLUMNS} FROM appointments WHERE category = ? ORDER BY id",
+                                          (category,))
+        return [row_to_appointment(row) for row in rows]
+
+    def count(self, category):
+        return self._connection().execute("SELECT COUNT(*) FROM appointments WHERE category = ?",
+                                          (category,)).fetchone()[0]
+
+    def overlap_candidates(self, start, end):
+        conn = self._connection()
+        longest = self._longest(conn)
+        if longest is None:
+            return iter(())
+        lo = -sys.maxsize if start is None else start - longest
+        hi = sys.maxsize if end is None else end
+        rows = conn.execute(f"SELECT {COLUMNS} FROM appointments WHERE starts_at BETWEEN ? AND ? "
+                            "AND frequency IS NULL ORDER BY starts_at, id", (lo, hi))
+        return map(row_to_appointment, rows)
+
+    def single_overlaps(self, start, end, inclusive = True):
+        conn = self._connection()
+        longest = self._longest(conn)
+        if longest is None:
+            return iter(())
+        if inclusive:
+            query = "starts_at >= ? AND starts_at <= ? AND ends_at >= ?"
+        else:
+            query = "starts_at >= ? AND starts_at < ? AND ends_at > ?"
+        rows = conn.execute(f"SELECT {COLUMNS} FROM appointments WHERE {query} AND frequency IS NULL",
+                            (start - longest, end, start))
+        return map(row_to_appointment, rows)
+
+    def id_page(self, after_id, limit, category = None):
+        if category is None:
+            rows = self._connection().execute(f"SELECT {COLUMNS} FROM appointments WHERE id > ? ORDER BY id LIMIT ?",
+                                              (after_id, limit))
+        else:
+            rows = self._connection().execute(f"SELECT {COLUMNS} FROM appointments WHERE category = ? AND id > ? "
+                                              "ORDER BY id LIMIT ?", (category, after_id, limit))
+        return [row_to_appointment(row) for row in rows]
+
+    def start_page(self, after, limit):
+        rows = self._connection().execute(f"SELECT {COLUMNS} FROM appointments WHERE (starts_at, id) > (?, ?) "
+                                          "AND frequency IS NULL ORDER BY starts_at, id LIMIT ?", after + (limit,))
+        return [row_to_appointment(row) for row in rows]
+
+    def longest_duration(self):
+        return self._longest(self._connection())
+
+    def series(self):
+        rows = self._connection().execute(f"SELECT {COLUMNS} FROM appointments WHERE frequency IS NOT NULL "
+                                          "ORDER BY id")
+        return [row_to_appointment(row) for row in rows]
+
+    def append(self, appt):
+        self.extend([appt])
+
+    def add_many(self, items):
+        with self.transaction():
+            first_id = self.next_id
+            appts = [Appointment(appt_id, *item) for appt_id, item in enumerate(items, start = first_id)]
+            self.extend(appts)
+            return appts
+
+    def extend(self, appts):
+        with self.transaction() as conn:
+            try:
+                conn.executemany(f"INSERT INTO appointments ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                 map(appointment_to_row, appts))
+            except sqlite3.IntegrityError as e:
+                if "appointments.id" not in str(e):
+                    raise
+                raise ValueError("Duplicate appointment id in bulk insert")
+            self._bump_version(conn)
+
+    def update(self, appt, **fields):
+        validate_minutes(*(fields[name] for name in ("start", "end") if name in fields))
+        for name, value in fields.items():
+            setattr(appt, name, sys.intern(value) if name == "category" else value)
+        with self.transaction() as conn:
+            row = appointment_to_row(appt)
+            conn.execute("UPDATE appointments SET title = ?, starts_at = ?, ends_at = ?, category = ?, frequency = ?, "
+                         "repeat_count = ?, repeat_until = ? WHERE id = ?", row[1:] + row[:1])
+            self._bump_version(conn)
+
+    def delete(self, appt_id):
+        with self.transaction() as conn:
+            appt = self.get(appt_id)
+            if appt is not None:
+                conn.execute("DELETE FROM appointments WHERE id = ?", (appt_id,))
+                self._bump_version(conn)
+            return appt
+
+    def clear(self):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM appointments")
+            conn.execute("DELETE FROM sqlite_sequence WHERE name = 'appointments'")
+            self._bump_version(conn)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _longest(self, conn):
+        return conn.execute("SELECT MAX(ends_at - starts_at) FROM appointments WHERE frequency IS NULL").fetchone()[0]
+
+    def _bump_version(self, conn):
+        conn.execute("UPDATE store_meta SET value = value + 1 WHERE key = 'version'")
+
+    def _connection(self):
+        # one connection per thread and process; a forked worker must not reuse its parent's
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, isolation_level = None, timeout = BUSY_TIMEOUT,
+                               check_same_thread = False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        self._local.depth = 0
+        return conn
@@ -0,0 +1,756 @@
+import sys
+import threading
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from calendar import monthrange
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from heapq import merge
+from itertools import chain, islice
+from operator import attrgetter, sub
+from uuid import uuid4
+
+from locking import ReadWriteLock, reads, writes
+from metrics import metrics
+
+BULK_INDEX_THRESHOLD = 32
+# serialized views kept by AppointmentStore.serialized, the oldest one goes first
+SERIALIZED_CACHE_SIZE = 16 * 1024
+EPOCH = datetime(1970, 1, 1)
+MINUTE = timedelta(minutes = 1)
+FREQUENCIES = ["daily", "weekly", "monthly"]
+# repeat interval in minutes, monthly ones vary and use the shortest month
+PERIODS = {"daily": 24 * 60, "weekly": 7 * 24 * 60, "monthly": 28 * 24 * 60}
+
+# count or until (in minutes) bounds the series, the other one is None
+Recurrence = namedtuple("Recurrence", ["frequency", "count", "until"])
+
+
+def to_minutes(value):
+    return (value - EPOCH) // MINUTE
+
+
+def to_datetime(minutes):
+    return EPOCH + timedelta(minutes = minutes)
+
+
+def validate_minutes(*values):
+    # every stored minute has to map to a datetime, which also keeps it inside the 'q' index columns
+    try:
+        for value in values:
+            to_datetime(value)
+    except OverflowError:
+        raise ValueError("Invalid time: outside the supported date range")
+
+
+def add_months(minutes, months):
+    # same day of month, clamped to the last day of shorter months
+    value = to_datetime(minutes)
+    month = value.month - 1 + months
+    year = value.year + month // 12
+    month = month % 12 + 1
+    return to_minutes(value.replace(year = year, month = month, day = min(value.day, monthrange(year, month)[1])))
+
+
+def validate_recurrence(start, end, recurrence):
+    if recurrence.frequency not in FREQUENCIES:
+        raise ValueError(f"Invalid recurrence frequency. Must be one of {FREQUENCIES}")
+    if end - start >= PERIODS[recurrence.frequency]:
+        raise ValueError("Invalid recurrence: appointment is longer than its repeat interval")
+    if recurrence.until is not None and recurrence.until < start:
+        raise ValueError("Invalid recurrence: 'until' is before 'start'")
+    try:
+        to_datetime(Appointment(None, "", start, end, "", recurrence).last_end())
+    except (OverflowError, ValueError):
+        raise ValueError("Invalid recurrence: the series ends after the year 9999")
+
+
+class Appointment:
+    # start and end are minutes since EPOCH, category is interned so all records share one string.
+    # A recurring appointment is one record for the whole series: start and end belong to the first
+    # occurrence, the others are computed from the recurrence only when a query needs them.
+    __slots__ = ("id", "title", "start", "end", "category", "recurrence")
+
+    def __init__(self, appt_id, title, start, end, category, recurrence = None):
+        self.id = appt_id
+        self.title = title
+        self.start = start
+        self.end = end
+        self.category = sys.intern(category)
+        self.recurrence = recurrence
+
+    def __repr__(self):
+        recurrence = "" if self.recurrence is None else f", recurrence={self.recurrence!r}"
+        return (f"{type(self).__name__}(id={self.id!r}, title={self.title!r}, start={to_datetime(self.start)}, "
+                f"end={to_datetime(self.end)}, category={self.category!r}{recurrence})")
+
+    @property
+    def start_time(self):
+        return to_datetime(self.start)
+
+    @property
+    def end_time(self):
+        return to_datetime(self.end)
+
+    def occurrence_start(self, index):
+        if index == 0 or self.recurrence is None:
+            return self.start
+        if self.recurrence.frequency == "monthly":
+            return add_months(self.start, index)
+        return self.start + index * PERIODS[self.recurrence.frequency]
+
+    def occurrence_count(self):
+        recurrence = self.recurrence
+        if recurrence is None:
+            return 1
+        if recurrence.count is not None:
+            return recurrence.count
+        if recurrence.until < self.start:
+            return 0
+        if recurrence.frequency != "monthly":
+            return (recurrence.until - self.start) // PERIODS[recurrence.frequency] + 1
+        first, last = to_datetime(self.start), to_datetime(recurrence.until)
+        months = (last.year - first.year) * 12 + last.month - first.month
+        if add_months(self.start, months) > recurrence.until:
+            months -= 1
+        return months + 1
+
+    def last_end(self):
+        count = self.occurrence_count()
+        return self.occurrence_start(count - 1) + self.end - self.start if count else self.start
+
+    def occurrence_range(self, start, end, inclusive = True):
+        # indexes of the occurrences overlapping [start, end]; starts grow with the index, so two
+        # binary searches find them without generating the series. Either bound may be None.
+        indexes = range(self.occurrence_count())
+        duration = self.end - self.start
+        if inclusive:
+            lo = 0 if start is None else bisect_left(indexes, start - duration, key = self.occurrence_start)
+            hi = len(indexes) if end is None else bisect_right(indexes, end, key = self.occurrence_start)
+        else:
+            lo = 0 if start is None else bisect_right(indexes, start - duration, key = self.occurrence_start)
+            hi = len(indexes) if end is None else bisect_left(indexes, end, key = self.occurrence_start)
+        return indexes[lo:max(lo, hi)]
+
+    def occurrences(self, start = None, end = None):
+        duration = self.end - self.start
+        for index in self.occurrence_range(start, end):
+            occurrence_start = self.occurrence_start(index)
+            yield Occurrence(self, index, occurrence_start, occurrence_start + duration)
+
+    def overlaps_series(self, other, inclusive = True):
+        # walk the occurrences of the shorter series inside the other one's span and look each of
+        # them up in the other series
+        if self.occurrence_count() > other.occurrence_count():
+            self, other = other, self
+        for occurrence in self.occurrences(other.start, other.last_end()):
+            if other.occurrence_range(occurrence.start, occurrence.end, inclusive):
+                return True
+        return False
+
+    def overlaps(self, other, inclusive = True):
+        if self.recurrence is None and other.recurrence is None:
+            if inclusive:
+                return self.start <= other.end and self.end >= other.start
+            return self.start < other.end and self.end > other.start
+        if other.recurrence is None:
+            return bool(self.occurrence_range(other.start, other.end, inclusive))
+        if self.recurrence is None:
+            return bool(other.occurrence_range(self.start, self.end, inclusive))
+        return self.overlaps_series(other, inclusive)
+
+
+class Occurrence(Appointment):
+    # one generated instance of a recurring appointment, carries the series id and its position
+    __slots__ = ("index",)
+
+    def __init__(self, series, index, start, end):
+        super().__init__(series.id, series.title, start, end, series.category, series.recurrence)
+        self.index = index
+
+
+class AppointmentNotFound(LookupError):
+    pass
+
+
+class AppointmentOverlap(ValueError):
+
+    def __init__(self, conflict):
+        super().__init__(f"Overlaps appointment {conflict.id}")
+        self.conflict = conflict
+
+
+def sweep_batch_conflicts(intervals, existing, series = ()):
+    # intervals are start-sorted (start, end) pairs, existing the start-sorted appointments that may
+    # overlap them and series the recurring ones. One merge sweep reports, per interval,
+    # ("store", appt), ("batch", index) or None. Store conflicts of an interval are settled before it
+    # is compared with the batch, so it can only lose to an interval that is accepted for good.
+    conflicts = [None] * len(intervals)
+    # accepted intervals never overlap each other, so the last one always has the latest end
+    last_accepted = None
+    store_end = store_appt = None
+
+    existing = iter(existing)
+    pending = next(existing, None)
+    for i, (start, end) in enumerate(intervals):
+        while pending is not None and pending.start <= start:
+            if store_end is None or pending.end > store_end:
+                store_end, store_appt = pending.end, pending
+            pending = next(existing, None)
+        # pending is the first appointment starting after start, so it decides about later ones
+        if store_end is not None and start <= store_end:
+            conflicts[i] = ("store", store_appt)
+        elif pending is not None and pending.start <= end:
+            conflicts[i] = ("store", pending)
+        else:
+            blocking = next((rule for rule in series if rule.occurrence_range(start, end)), None)
+            if blocking is not None:
+                conflicts[i] = ("store", blocking)
+            elif last_accepted is not None and start <= intervals[last_accepted][1]:
+                conflicts[i] = ("batch", last_accepted)
+            else:
+                last_accepted = i
+    return conflicts
+
+
+def sweep_free_slots(appointments, start, end, duration):
+    # appointments are start-sorted. Touching counts as overlapping, so a gap begins one minute after
+    # an appointment ends and stops one minute before the next one starts; a slot of duration inside a
+    # returned (start, end) gap overlaps none of the given appointments.
+    free = []
+    earliest = start
+    for appt in appointments:
+        if appt.start - 1 - earliest >= duration:
+            free.append((earliest, appt.start - 1))
+        earliest = max(earliest, appt.end + 1)
+    if end - earliest >= duration:
+        free.append((earliest, end))
+    return free
+
+
+class AppointmentBackend(ABC):
+    # Storage interface used by api.py. A backend implements transaction() and the abstract primitives;
+    # the checked operations below combine them inside one transaction.
+
+    @abstractmethod
+    def transaction(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def __iter__(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def __len__(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, appt_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def by_category(self, category):
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self, category):
+        raise NotImplementedError
+
+    @abstractmethod
+    def overlap_candidates(self, start, end):
+        # start-sorted non-recurring appointments that may overlap [start, end], either bound may be None
+        raise NotImplementedError
+
+    @abstractmethod
+    def id_page(self, after_id, limit, category = None):
+        # up to limit appointments with ids above after_id, in id order
+        raise NotImplementedError
+
+    @abstractmethod
+    def start_page(self, after, limit):
+        # up to limit non-recurring appointments after the (start, id) key, in (start, id) order
+        raise NotImplementedError
+
+    @abstractmethod
+    def longest_duration(self):
+        # of the non-recurring appointments, None when there are none
+        raise NotImplementedError
+
+    @abstractmethod
+    def series(self):
+        # all recurring appointments
+        raise NotImplementedError
+
+    @abstractmethod
+    def append(self, appt):
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_many(self, items):
+        raise NotImplementedError
+
+    @abstractmethod
+    def extend(self, appts):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, appt, **fields):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, appt_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self):
+        raise NotImplementedError
+
+    def serialized(self, appt, serializer, keep = True):
+        return serializer(appt)
+
+    def add(self, title, start, end, category, recurrence = None):
+        return self.add_many([(title, start, end, category, recurrence)])[0]
+
+    def put(self, appt):
+        with self.transaction():
+            current = self.get(appt.id)
+            if current is None:
+                self.append(appt)
+            else:
+                self.update(current, title = appt.title, start = appt.start, end = appt.end,
+                            category = appt.category, recurrence = appt.recurrence)
+
+    def remove(self, appt):
+        if self.delete(appt.id) is None:
+            raise ValueError("appointment not in store")
+
+    @metrics.timed("overlap")
+    def find_overlap(self, start, end, exclude_id = None, inclusive = True, recurrence = None):
+        # recurring appointments are checked by arithmetic on their rule, never expanded in full
+        probe = Appointment(None, "", start, end, "", recurrence)
+        if recurrence is None:
+            singles = self.single_overlaps(start, end, inclusive)
+        else:
+            singles = self.overlap_candidates(start, probe.last_end())
+        for appt in chain(singles, self.series()):
+            if appt.id != exclude_id and probe.overlaps(appt, inclusive):
+                return appt
+        return None
+
+    def single_overlaps(self, start, end, inclusive = True):
+        # non-recurring appointments that may overlap [start, end]; backends can narrow this further
+        return self.overlap_candidates(start, end)
+
+    @metrics.timed("overlap")
+    def find_batch_conflicts(self, intervals):
+        if not intervals:
+            return []
+        return sweep_batch_conflicts(intervals,
+                                     self.overlap_candidates(intervals[0][0], max(end for _, end in intervals)),
+                                     list(self.series()))
+
+    @metrics.timed("overlap")
+    def query_range(self, start = None, end = None):
+        candidates = self.overlap_candidates(start, end)
+        if start is not None:
+            candidates = [appt for appt in candidates if appt.end >= start]
+        # recurring appointments only contribute the occurrences inside the window
+        occurrences = [rule.occurrences(start, end) for rule in self.series()]
+        if not occurrences:
+            return list(candidates)
+        return list(merge(candidates, *occurrences, key = attrgetter("start")))
+
+    def query_page(self, start, end, after, limit, category = None):
+        # query_range a page at a time: up to limit appointments overlapping [start, end] in (start, id)
+        # order after the (start, id) key, from the beginning when it is None. Singles are read from the
+        # start index in chunks, series only contribute their occurrences from the key on.
+        def singles():
+            longest = self.longest_duration()
+            if longest is None:
+                return
+            key = after or (-sys.maxsize, -sys.maxsize)
+            if start is not None:
+                key = max(key, (start - longest, -sys.maxsize))
+            while True:
+                chunk = self.start_page(key, limit)
+                for appt in chunk:
+                    if end is not None and appt.start > end:
+                        return
+                    if start is None or appt.end >= start:
+                        yield appt
+                if len(chunk) < limit:
+                    return
+                key = (chunk[-1].start, chunk[-1].id)
+
+        lo = start
+        if after is not None:
+            lo = after[0] if start is None else max(start, after[0])
+        by_key = attrgetter("start", "id")
+        selected = merge(singles(), *(rule.occurrences(lo, end) for rule in self.series()), key = by_key)
+        if after is not None:
+            selected = (appt for appt in selected if by_key(appt) > after)
+        if category is not None:
+            selected = (appt for appt in selected if appt.category == category)
+        return list(islice(selected, limit))
+
+    def find_free_slots(self, start, end, duration, categories = None):
+        # with categories, only appointments in those categories block time. Overlap checks ignore the
+        # category, so a slot is only bookable as is when no other appointment falls into it.
+        busy = self.query_range(start, end)
+        if categories is not None:
+            busy = [appt for appt in busy if appt.category in categories]
+        return sweep_free_slots(busy, start, end, duration)
+
+    def create(self, title, start, end, category, recurrence = None):
+        with self.transaction():
+            conflict = self.find_overlap(start, end, recurrence = recurrence)
+            if conflict is not None:
+                raise AppointmentOverlap(conflict)
+            return self.add(title, start, end, category, recurrence)
+
+    def replace(self, appt_id, title, start, end, category, recurrence = None):
+        with self.transaction():
+            conflict = self.find_overlap(start, end, exclude_id = appt_id, recurrence = recurrence)
+            if conflict is not None:
+                raise AppointmentOverlap(conflict)
+            appt = self.get(appt_id)
+            if appt is None:
+                raise AppointmentNotFound(appt_id)
+            self.update(appt, title = title, start = start, end = end, category = category, recurrence = recurrence)
+            return appt
+
+    def shift(self, appt_id, start_delta, end_delta):
+        with self.transaction():
+            appt = self.get(appt_id)
+            if appt is None:
+                raise AppointmentNotFound(appt_id)
+
+            new_start = appt.start + start_delta
+            new_end = appt.end + end_delta
+            if new_start > new_end:
+                raise ValueError("Shift would result in start after end")
+            validate_minutes(new_start, new_end)
+            if appt.recurrence is not None:
+                validate_recurrence(new_start, new_end, appt.recurrence)
+            conflict = self.find_overlap(new_start, new_end, exclude_id = appt_id, inclusive = False,
+                                         recurrence = appt.recurrence)
+            if conflict is not None:
+                raise AppointmentOverlap(conflict)
+            self.update(appt, start = new_start, end = new_end)
+            return appt
+
+    def check_batch(self, items):
+        # items are (title, start, end, category[, recurrence]) in request order, conflicts come back in that
+        # order with batch conflicts pointing at request positions. Single appointments go through the
+        # sweep first, recurring ones are then checked against the store and everything accepted so far.
+        rules = [i for i, item in enumerate(items) if len(item) > 4 and item[4] is not None]
+        singles = sorted(set(range(len(items))).difference(rules))
+        order = sorted(singles, key = lambda i: items[i][1])
+        found = self.find_batch_conflicts([(items[i][1], items[i][2]) for i in order])
+        conflicts = [None] * len(items)
+        for i, conflict in zip(order, found):
+            if conflict is not None and conflict[0] == "batch":
+                conflict = ("batch", order[conflict[1]])
+            conflicts[i] = conflict
+        if not rules:
+            return conflicts
+
+        accepted = [Appointment(i, "", items[i][1], items[i][2], "") for i in singles if conflicts[i] is None]
+        for i in rules:
+            _, start, end, _, recurrence = items[i]
+            conflict = self.find_overlap(start, end, recurrence = recurrence)
+            if conflict is not None:
+                conflicts[i] = ("store", conflict)
+                continue
+            rule = Appointment(i, "", start, end, "", recurrence)
+            clash = next((appt for appt in accepted if rule.overlaps(appt)), None)
+            if clash is not None:
+                conflicts[i] = ("batch", clash.id)
+            else:
+                accepted.append(rule)
+        return conflicts
+
+    def add_batch(self, items, atomic = True):
+        with self.transaction():
+            conflicts = self.check_batch(items)
+            accepted = [i for i, conflict in enumerate(conflicts) if conflict is None]
+            created = [None] * len(items)
+            if atomic and len(accepted) != len(items):
+                return conflicts, created
+
+            for i, appt in zip(accepted, self.add_many([items[i] for i in accepted])):
+                created[i] = appt
+            return conflicts, created
+
+
+class AppointmentStore(AppointmentBackend):
+
+    def __init__(self):
+        # writes take the lock exclusively, reads share it; see locking.py
+        self.lock = ReadWriteLock()
+        self._pending_sync = threading.local()
+        # id -> appointment, dicts keep insertion order for listing
+        self._by_id = {}
+        self.next_id = 1
+        # bumped on every write; together with epoch it identifies a state of the store
+        self.epoch = uuid4().hex[:12]
+        self.version = 0
+        # optional write-ahead journal (see persistence.py), told about every write
+        self.journal = None
+        # id -> cached serialized view, dropped whenever the appointment changes; readers fill it
+        # concurrently, so adding and evicting takes a lock of its own
+        self._serialized = {}
+        self._serialized_lock = threading.Lock()
+        # category -> sorted array of ids, ids grow with insertion so this is listing order
+        self._by_category = {}
+        # start-sorted interval index: parallel columns, kept in step on every write
+        self._start_keys = array("q")
+        self._start_entries = []
+        # sorted durations, the longest one bounds how far back an overlap can start
+        self._durations = array("q")
+        # id -> recurring appointment, these stay out of the interval index
+        self._series = {}
+
+    @contextmanager
+    def transaction(self):
+        if self.lock.is_writing():
+            yield
+            return
+        try:
+            with self.lock.writing():
+                yield
+        finally:
+            # runs once the lock is released, so the journal fsync does not block other requests
+            self.after_write()
+
+    @reads
+    def __iter__(self):
+        # iterate over a snapshot so concurrent writes cannot break the caller's loop
+        return iter(list(self._by_id.values()))
+
+    def __len__(self):
+        return len(self._by_id)
+
+    @reads
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self._by_id)
+        if not 0 <= index < len(self._by_id):
+            raise IndexError("appointment index out of range")
+        return next(islice(self._by_id.values(), index, None))
+
+    def get(self, appt_id):
+        return self._by_id.get(appt_id)
+
+    @reads
+    def serialized(self, appt, serializer, keep = True):
+        if isinstance(appt, Occurrence):
+            return serializer(appt)
+        view = self._serialized.get(appt.id)
+        if view is None:
+            view = serializer(appt)
+            if keep:
+                with self._serialized_lock:
+                    if len(self._serialized) >= SERIALIZED_CACHE_SIZE:
+                        del self._serialized[next(iter(self._serialized))]
+                    self._serialized[appt.id] = view
+        return view
+
+    @reads
+    def by_category(self, category):
+        by_id = self._by_id
+        return [by_id[appt_id] for appt_id in self._by_category.get(category, ())]
+
+    def count(self, category):
+        return len(self._by_category.get(category, ()))
+
+    @writes
+    def append(self, appt):
+        self._insert(appt)
+        self._log("put", [appt])
+
+    @writes
+    def add_many(self, items):
+        appts = []
+        for appt_id, item in enumerate(items, start = self.next_id):
+            appts.append(Appointment(appt_id, *item))
+        self.extend(appts)
+        return appts
+
+    @writes
+    def extend(self, appts):
+        ids = set(map(attrgetter("id"), appts))
+        if len(ids) != len(appts) or not ids.isdisjoint(self._by_id):
+            raise ValueError("Duplicate appointment id in bulk insert")
+
+        if len(appts) < BULK_INDEX_THRESHOLD:
+            for appt in appts:
+                self._insert(appt)
+            self._log("put", appts)
+            return
+
+        log = appts
+        self._series.update((appt.id, appt) for appt in appts if appt.recurrence is not None)
+        if self._series:
+            appts = [appt for appt in appts if appt.recurrence is None]
+
+        self._by_id.update(zip(map(attrgetter("id"), log), log))
+        for category in set(map(attrgetter("category"), log)):
+            members = sorted(appt.id for appt in log if appt.category is category)
+            bucket = self._by_category.setdefault(category, array("q"))
+            if bucket and bucket[-1] > members[0]:
+                # two sorted runs, so the sort is a linear merge
+                members = sorted(bucket.tolist() + members)
+                del bucket[:]
+            bucket.extend(members)
+        self.next_id = max(self.next_id, max(ids) + 1)
+        self.version += 1
+
+        # one stable sort over two sorted runs is a linear merge, instead of a list.insert per appointment
+        entries = self._start_entries + sorted(appts, key = attrgetter("start"))
+        entries.sort(key = attrgetter("start"))
+        self._start_entries = entries
+        self._start_keys = array("q", map(attrgetter("start"), entries))
+        durations = self._durations.tolist()
+        durations.extend(map(sub, map(attrgetter("end"), appts), map(attrgetter("start"), appts)))
+        durations.sort()
+        self._durations = array("q", durations)
+        self._log("put", log)
+
+    @writes
+    def delete(self, appt_id):
+        appt = self._by_id.pop(appt_id, None)
+        if appt is not None:
+            self._drop_from_category(appt.category, appt_id)
+            self._serialized.pop(appt_id, None)
+            self.version += 1
+            self._unindex(appt)
+            self._log("delete", [appt])
+        return appt
+
+    @writes
+    def update(self, appt, **fields):
+        # checked first, a failure halfway through would leave the record out of the interval index
+        validate_minutes(*(fields[name] for name in ("start", "end") if name in fields))
+        reindex = "start" in fields or "end" in fields or "recurrence" in fields
+        if reindex:
+            self._unindex(appt)
+        old_category = appt.category
+        for name, value in fields.items():
+            setattr(appt, name, sys.intern(value) if name == "category" else value)
+        self._serialized.pop(appt.id, None)
+        self.version += 1
+        if reindex:
+            self._index(appt)
+        if appt.category != old_category:
+            self._move_category(appt, old_category)
+        self._log("put", [appt])
+
+    @writes
+    def clear(self):
+        self._by_id.clear()
+        self._by_category.clear()
+        self._serialized.clear()
+        self.next_id = 1
+        self.version += 1
+        del self._start_keys[:]
+        self._start_entries.clear()
+        del self._durations[:]
+        self._series.clear()
+        self._log("clear")
+
+    @reads
+    def overlap_candidates(self, start, end):
+        if not self._durations:
+            return []
+        lo = 0 if start is None else bisect_left(self._start_keys, start - self._durations[-1])
+        hi = len(self._start_keys) if end is None else bisect_right(self._start_keys, end)
+        return self._start_entries[lo:hi]
+
+    @reads
+    def id_page(self, after_id, limit, category = None):
+        # every bucket is sorted, so the page is a merge of at most limit ids from each of them
+        buckets = self._by_category.values() if category is None else [self._by_category.get(category, ())]
+        slices = []
+        for bucket in buckets:
+            pos = bisect_right(bucket, after_id)
+            slices.append(bucket[pos:pos + limit])
+        return [self._by_id[appt_id] for appt_id in islice(merge(*slices), limit)]
+
+    @reads
+    def start_page(self, after, limit):
+        start, appt_id = after
+        entries = self._start_entries
+        pos = bisect_left(self._start_keys, start)
+        while pos < len(entries) and entries[pos].start == start and entries[pos].id <= appt_id:
+            pos += 1
+        return entries[pos:pos + limit]
+
+    def longest_duration(self):
+        return self._durations[-1] if self._durations else None
+
+    @reads
+    def series(self):
+        return list(self._series.values())
+
+    def _insert(self, appt):
+        if appt.id in self._by_id:
+            raise ValueError(f"Duplicate appointment id {appt.id}")
+        self._by_id[appt.id] = appt
+        self._add_to_category(appt.category, appt.id)
+        self.next_id = max(self.next_id, appt.id + 1)
+        self.version += 1
+        self._index(appt)
+
+    def after_write(self):
+        seq = getattr(self._pending_sync, "seq", 0)
+        if seq and self.journal is not None:
+            self._pending_sync.seq = 0
+            self.journal.sync(seq)
+
+    def _log(self, op, appts = ()):
+        if self.journal is None:
+            return
+        self._pending_sync.seq = self.journal.append(op, appts)
+        if self.journal.needs_compaction():
+            self.journal.compact(self)
+
+    def _move_category(self, appt, old_category):
+        self._drop_from_category(old_category, appt.id)
+        self._add_to_category(appt.category, appt.id)
+
+    def _add_to_category(self, category, appt_id):
+        bucket = self._by_category.setdefault(category, array("q"))
+        if not bucket or bucket[-1] < appt_id:
+            bucket.append(appt_id)
+        else:
+            insort(bucket, appt_id)
+
+    def _drop_from_category(self, category, appt_id):
+        bucket = self._by_category[category]
+        del bucket[bisect_left(bucket, appt_id)]
+
+    def _index(self, appt):
+        if appt.recurrence is not None:
+            self._series[appt.id] = appt
+            return
+        pos = bisect_right(self._start_keys, appt.start)
+        # equal starts stay in id order for start_page
+        while pos and self._start_keys[pos - 1] == appt.start and self._start_entries[pos - 1].id > appt.id:
+            pos -= 1
+        self._start_keys.insert(pos, appt.start)
+        self._start_entries.insert(pos, appt)
+        insort(self._durations, appt.end - appt.start)
+
+    def _unindex(self, appt):
+        if appt.recurrence is not None:
+            del self._series[appt.id]
+            return
+        pos = bisect_left(self._start_keys, appt.start)
+        while self._start_entries[pos] is not appt:
+            pos += 1
+        del self._start_keys[pos]
+        del self._start_entries[pos]
+        del self._durations[bisect_left(self._durations, appt.end - appt.start)]
@@ -1,9 +1,19 @@
+import base64
+import json
+import sys
+import threading
 import unittest
 from datetime import datetime
 from unittest.mock import patch
 
 from api import app, appointments, extract_and_validate_data_fields, validate_category_types, CATEGORY_TYPES, \
-    validate_appointment
+    validate_appointment, serialize_datetime_format, extract_shift_deltas, format_minutes, parse_time, TIME_FORMAT
+from metrics import metrics
+from store import Appointment, to_minutes
+
+
+def make_appointment(appt_id, title, start, end, category):
+    return Appointment(appt_id, title, to_minutes(start), to_minutes(end), category)
 
 
 class TestApi(unittest.TestCase):
@@ -37,10 +47,10 @@ class TestApi(unittest.TestCase):
                                     json = {"title": "Meeting", "start": "2025-09-26 10:00",
                                             "end": "2025-09-26 12:00", "category": "general"})
         self.assertEqual(response.status_code, 201)
-        self.assertEqual(appointments[0]["title"], "Meeting")
-        self.assertEqual(appointments[0]["start"], datetime(2025, 9, 26, 10, 0))
-        self.assertEqual(appointments[0]["end"], datetime(2025, 9, 26, 12, 0))
-        self.assertEqual(appointments[0]["category"], "general")
+        self.assertEqual(appointments[0].title, "Meeting")
+        self.assertEqual(appointments[0].start_time, datetime(2025, 9, 26, 10, 0))
+        self.assertEqual(appointments[0].end_time, datetime(2025, 9, 26, 12, 0))
+        self.assertEqual(appointments[0].category, "general")
 
     def test_create_overlapping_appointment(self):
         self.client.post("/appointments",
@@ -59,15 +69,15 @@ class TestApi(unittest.TestCase):
         self.client.post("/appointments",
                          json = {"title": "Meeting", "start": "2025-09-26 10:00", "end": "2025-09-26 12:00",
                                  "category": "general"})
-        appt_id = appointments[0]["id"]
+        appt_id = appointments[0].id
         response = self.client.put(f"/appointments/{appt_id}",
                                    json = {"title": "Sommerfest Meeting", "start": "2025-09-26 13:00",
                                            "end": "2025-09-26 15:00", "category": "general"})
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(appointments[0]["title"], "Sommerfest Meeting")
-        self.assertEqual(appointments[0]["start"], datetime(2025, 9, 26, 13, 0))
-        self.assertEqual(appointments[0]["end"], datetime(2025, 9, 26, 15, 0))
-        self.assertEqual(appointments[0]["category"], "general")
+        self.assertEqual(appointments[0].title, "Sommerfest Meeting")
+        self.assertEqual(appointments[0].start_time, datetime(2025, 9, 26, 13, 0))
+        self.assertEqual(appointments[0].end_time, datetime(2025, 9, 26, 15, 0))
+        self.assertEqual(appointments[0].category, "general")
         mock_extract.assert_called()
 
     def test_update_overlapping_appointment(self):
@@ -97,7 +107,7 @@ class TestApi(unittest.TestCase):
         self.client.post("/appointments",
                          json = {"title": "Meeting", "start": "2025-09-26 10:00", "end": "2025-09-26 12:00",
                                  "category": "general"})
-        appt_id = appointments[0]["id"]
+        appt_id = appointments[0].id
         response = self.client.delete(f"/appointments/{appt_id}")
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json["status"], "deleted")
@@ -144,6 +154,24 @@ class TestApi(unittest.TestCase):
         with self.assertRaises(ValueError):
             extract_and_validate_data_fields(json_data)
 
+    def test_parse_time_matches_strptime(self):
+        for value in ["2025-09-26 10:00", "2024-02-29 23:59", "2025-9-5 1:05", "0999-01-01 00:00",
+                      "２０２５-09-26 10:00"]:
+            self.assertEqual(parse_time(value), datetime.strptime(value, TIME_FORMAT))
+
+        for value in ["2025-02-30 10:00", "2025-0a-26 12:00", "2025-09-26 10:00 ", "2025-09-26T10:00",
+                      "2025-09-26 24:00", "2025-W39-5 10:00", "+025-09-26 10:00", "", None]:
+            with self.assertRaises(Exception) as expected:
+                datetime.strptime(value, TIME_FORMAT)
+            with self.assertRaises(type(expected.exception)) as actual:
+                parse_time(value)
+            self.assertEqual(str(actual.exception), str(expected.exception))
+
+    def test_format_minutes_matches_strftime(self):
+        for value in [datetime(2025, 9, 26, 10, 0), datetime(1970, 1, 1), datetime(1969, 12, 31, 23, 59),
+                      datetime(999, 1, 1, 8, 5), datetime(9999, 12, 31, 23, 59)]:
+            self.assertEqual(format_minutes(to_minutes(value)), value.strftime(TIME_FORMAT))
+
     def test_extract_fields_with_invalid_appointment(self):
         with self.assertRaises(ValueError) as contextManager:
             extract_and_validate_data_fields({})
@@ -159,20 +187,17 @@ class TestApi(unittest.TestCase):
         self.assertEqual(response.status_code, 201)
 
         self.assertEqual(len(appointments), 1)
-        self.assertEqual(appointments[0]["title"], "Meeting")
-        self.assertEqual(appointments[0]["start"], datetime(2025, 9, 26, 10, 0))
-        self.assertEqual(appointments[0]["end"], datetime(2025, 9, 26, 12, 0))
+        self.assertEqual(appointments[0].title, "Meeting")
+        self.assertEqual(appointments[0].start_time, datetime(2025, 9, 26, 10, 0))
+        self.assertEqual(appointments[0].end_time, datetime(2025, 9, 26, 12, 0))
 
     def test_list_appointments_with_category_filter(self):
-        appointments.append(
-            {"id": 1, "title": "Arzt", "start": datetime(2025, 9, 26, 13, 0), "end": datetime(2025, 9, 26, 14, 0),
-             "category": "health"})
-        appointments.append(
-            {"id": 2, "title": "Meeting", "start": datetime(2025, 9, 26, 15, 0), "end": datetime(2025, 9, 26, 16, 0),
-             "category": "work"})
-        appointments.append(
-            {"id": 3, "title": "Zahnarzt", "start": datetime(2025, 9, 26, 18, 0), "end": datetime(2025, 9, 26, 18, 30),
-             "category": "health"})
+        appointments.append(make_appointment(1, "Arzt", datetime(2025, 9, 26, 13, 0),
+                                             datetime(2025, 9, 26, 14, 0), "health"))
+        appointments.append(make_appointment(2, "Meeting", datetime(2025, 9, 26, 15, 0),
+                                             datetime(2025, 9, 26, 16, 0), "work"))
+        appointments.append(make_appointment(3, "Zahnarzt", datetime(2025, 9, 26, 18, 0),
+                                             datetime(2025, 9, 26, 18, 30), "health"))
 
         response = self.client.get("/appointments?category=health")
         self.assertEqual(response.status_code, 200)
@@ -181,7 +206,8 @@ class TestApi(unittest.TestCase):
         self.assertEqual(response.json[1]["category"], "health")
 
     def test_list_appointments_with_invalid_category(self):
-        appointments.append({"title": "Meeting", "start": "10:00", "end": "12:00", "category": "doesnotexist"})
+        appointments.append(make_appointment(1, "Meeting", datetime(2025, 9, 26, 10, 0),
+                                             datetime(2025, 9, 26, 12, 0), "doesnotexist"))
 
         response = self.client.get("/appointments?category=doesnotexist")
         self.assertIn("error", response.json)
@@ -195,7 +221,8 @@ class TestApi(unittest.TestCase):
         self.assertEqual(contextManager.exception.args[0], f"Invalid category. Must be one of {CATEGORY_TYPES}")
 
     def test_no_appointments_for_category(self):
-        appointments.append({"title": "Meeting", "start": "10:00", "end": "12:00", "category": "general"})
+        appointments.append(make_appointment(1, "Meeting", datetime(2025, 9, 26, 10, 0),
+                                             datetime(2025, 9, 26, 12, 0), "general"))
 
         response = self.client.get("/appointments?category=health")
         self.assertEqual(response.status_code, 404)
@@ -214,22 +241,17 @@ class TestApi(unittest.TestCase):
 
         for case in test_cases:
             appointments.clear()
-            appointments.append({
-                "id": 1,
-                "title": "Test Meeting",
-                "start": datetime(2024, 12, 31, 10, 0),
-                "end": datetime(2025, 1, 1, 11, 0),
-                "category": "work"
-            })
+            appointments.append(make_appointment(1, "Test Meeting", datetime(2024, 12, 31, 10, 0),
+                                                 datetime(2025, 1, 1, 11, 0), "work"))
 
             response = self.client.post(
                 f"/appointments/shift/1?amount_start={case['amount_start']}&amount_end={case['amount_end']}"
             )
 
             self.assertEqual(response.status_code, 200)
-            self.assertEqual(appointments[0]["id"], 1)
-            self.assertEqual(appointments[0]["start"], case["expected_start"])
-            self.assertEqual(appointments[0]["end"], case["expected_end"])
+            self.assertEqual(appointments[0].id, 1)
+            self.assertEqual(appointments[0].start_time, case["expected_start"])
+            self.assertEqual(appointments[0].end_time, case["expected_end"])
 
     def test_shift_appointment_false_id(self):
         response = self.client.post("/appointments/shift/0?amount=5")
@@ -239,75 +261,470 @@ class TestApi(unittest.TestCase):
         self.assertEqual(response.json["error"], "Appointment not found")
 
     def test_shift_appointment_false_amount(self):
-        appointments.append({
-            "id": 1,
-            "title": "Test Meeting",
-            "start": datetime(2024, 12, 31, 10, 0),
-            "end": datetime(2025, 1, 1, 11, 0),
-            "category": "work"
-        })
+        appointments.append(make_appointment(1, "Test Meeting", datetime(2024, 12, 31, 10, 0),
+                                             datetime(2025, 1, 1, 11, 0), "work"))
 
         response = self.client.post("/appointments/shift/1?amount_start=xx")
         self.assertIn("error", response.json)
         self.assertEqual(response.json["error"], "Invalid amount. Must be a number.")
 
+    def test_shift_outside_date_range_keeps_store_intact(self):
+        self.client.post("/appointments", json = {"title": "Meeting", "start": "2025-09-26 10:00",
+                                                  "end": "2025-09-26 11:00", "category": "work"})
+
+        for amount in ("3000000", "1e300"):
+            response = self.client.post(f"/appointments/shift/1?amount_start={amount}&amount_end={amount}")
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json["error"], "Invalid time: outside the supported date range")
+
+        self.assertEqual(self.client.get("/appointments").json[0]["start"], "2025-09-26 10:00")
+        response = self.client.post("/appointments", json = {"title": "Doppelt", "start": "2025-09-26 10:30",
+                                                             "end": "2025-09-26 10:45", "category": "work"})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.client.delete("/appointments/1").status_code, 200)
+
+    def test_shift_amounts_round_to_the_nearest_minute(self):
+        # 0.0007 days are 1.008 minutes
+        self.assertEqual(extract_shift_deltas({"amount_start": "0.0007", "amount_end": "-0.0007"}), (1, -1))
+        self.assertEqual(extract_shift_deltas({"amount_start": str(10 / 1440), "amount_end": str(-10 / 1440)}),
+                         (10, -10))
+        for amount in ("inf", "nan", "1e400"):
+            with self.assertRaises(ValueError):
+                extract_shift_deltas({"amount_start": amount})
+
     def test_end_shift(self):
-        appointments.append({
-            "id": 1,
-            "title": "Test Meeting",
-            "start": datetime(2024, 12, 31, 10, 0),
-            "end": datetime(2025, 1, 1, 11, 0),
-            "category": "work"
-        })
+        appointments.append(make_appointment(1, "Test Meeting", datetime(2024, 12, 31, 10, 0),
+                                             datetime(2025, 1, 1, 11, 0), "work"))
         response = self.client.post("/appointments/shift/1?amount_end=3")
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(appointments[0]["id"], 1)
-        self.assertEqual(appointments[0]["start"], datetime(2024, 12, 31, 10, 0))
-        self.assertEqual(appointments[0]["end"], datetime(2025, 1, 4, 11, 0))
+        self.assertEqual(appointments[0].id, 1)
+        self.assertEqual(appointments[0].start_time, datetime(2024, 12, 31, 10, 0))
+        self.assertEqual(appointments[0].end_time, datetime(2025, 1, 4, 11, 0))
 
     def test_start_and_end_shift(self):
-        appointments.append({
-            "id": 1,
-            "title": "Test Meeting",
-            "start": datetime(2024, 12, 31, 10, 0),
-            "end": datetime(2025, 1, 1, 11, 0),
-            "category": "work"
-        })
+        appointments.append(make_appointment(1, "Test Meeting", datetime(2024, 12, 31, 10, 0),
+                                             datetime(2025, 1, 1, 11, 0), "work"))
         response = self.client.post("/appointments/shift/1?amount_start=2.5&amount_end=3")
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(appointments[0]["id"], 1)
-        self.assertEqual(appointments[0]["start"], datetime(2025, 1, 2, 22, 0))
-        self.assertEqual(appointments[0]["end"], datetime(2025, 1, 4, 11, 0))
+        self.assertEqual(appointments[0].id, 1)
+        self.assertEqual(appointments[0].start_time, datetime(2025, 1, 2, 22, 0))
+        self.assertEqual(appointments[0].end_time, datetime(2025, 1, 4, 11, 0))
 
     def test_end_before_start(self):
-        appointments.append({
-            "id": 1,
-            "title": "Test Meeting",
-            "start": datetime(2023, 1, 1, 10, 0),
-            "end": datetime(2023, 1, 1, 11, 0),
-            "category": "work"
-        })
+        appointments.append(make_appointment(1, "Test Meeting", datetime(2023, 1, 1, 10, 0),
+                                             datetime(2023, 1, 1, 11, 0), "work"))
         response = self.client.post("/appointments/shift/1?amount_start=5&amount_end=1")
         self.assertEqual(response.status_code, 400)
         self.assertIn("error", response.json)
         self.assertEqual(response.json["error"], "Shift would result in start after end")
 
     def test_shift_overlapping_appointment(self):
-        appointments.append({
-            "id": 1,
-            "title": "Meeting 1",
-            "start": datetime(2025, 9, 26, 10, 0),
-            "end": datetime(2025, 9, 26, 12, 0),
-            "category": "work"
-        })
-        appointments.append({
-            "id": 2,
-            "title": "Meeting 2",
-            "start": datetime(2025, 9, 26, 13, 0),
-            "end": datetime(2025, 9, 26, 15, 0),
-            "category": "work"
-        })
+        appointments.append(make_appointment(1, "Meeting 1", datetime(2025, 9, 26, 10, 0),
+                                             datetime(2025, 9, 26, 12, 0), "work"))
+        appointments.append(make_appointment(2, "Meeting 2", datetime(2025, 9, 26, 13, 0),
+                                             datetime(2025, 9, 26, 15, 0), "work"))
 
         response = self.client.post("/appointments/shift/2?amount_start=-3&amount_end=0")
         self.assertEqual(response.status_code, 409)
         self.assertEqual(response.json["error"], "Shift would cause overlapping appointment")
+
+    def test_shift_touching_appointment_allowed(self):
+        appointments.append(make_appointment(1, "Meeting 1", datetime(2025, 9, 26, 10, 0),
+                                             datetime(2025, 9, 26, 12, 0), "work"))
+        appointments.append(make_appointment(2, "Meeting 2", datetime(2025, 9, 27, 12, 0),
+                                             datetime(2025, 9, 27, 14, 0), "work"))
+
+        response = self.client.post("/appointments/shift/2?amount_start=-1&amount_end=-1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(appointments[1].start_time, datetime(2025, 9, 26, 12, 0))
+
+    def test_create_touching_appointment_conflicts(self):
+        self.client.post("/appointments",
+                         json = {"title": "Meeting", "start": "2025-09-26 10:00", "end": "2025-09-26 12:00",
+                                 "category": "general"})
+        response = self.client.post("/appointments",
+                                    json = {"title": "Meeting2", "start": "2025-09-26 12:00", "end": "2025-09-26 13:00",
+                                            "category": "general"})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json["error"], "Overlapping appointment")
+
+    def test_update_overlap_with_later_appointment(self):
+        self.client.post("/appointments",
+                         json = {"title": "Meeting", "start": "2025-09-26 10:00", "end": "2025-09-26 12:00",
+                                 "category": "general"})
+        self.client.post("/appointments",
+                         json = {"title": "Meeting2", "start": "2025-09-26 13:00", "end": "2025-09-26 15:00",
+                                 "category": "general"})
+        appt_id = appointments[0].id
+        response = self.client.put(f"/appointments/{appt_id}",
+                                   json = {"title": "Meeting", "start": "2025-09-26 11:00", "end": "2025-09-26 14:00",
+                                           "category": "general"})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(appointments[0].end_time, datetime(2025, 9, 26, 12, 0))
+
+    def test_update_appointment_not_found_without_overlap(self):
+        response = self.client.put("/appointments/5",
+                                   json = {"title": "Meeting", "start": "2025-09-26 13:00", "end": "2025-09-26 14:00",
+                                           "category": "general"})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(appointments), 0)
+
+    def test_list_appointments_time_window(self):
+        for day in (22, 24, 29):
+            self.client.post("/appointments",
+                             json = {"title": f"Termin {day}", "start": f"2025-09-{day} 10:00",
+                                     "end": f"2025-09-{day} 11:00", "category": "work" if day == 24 else "general"})
+
+        response = self.client.get("/appointments?from=2025-09-22 10:30&to=2025-09-28 23:59")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([appt["title"] for appt in response.json], ["Termin 22", "Termin 24"])
+
+        response = self.client.get("/appointments?from=2025-09-23 00:00")
+        self.assertEqual([appt["title"] for appt in response.json], ["Termin 24", "Termin 29"])
+
+        response = self.client.get("/appointments?from=2025-09-23 00:00&category=general")
+        self.assertEqual([appt["title"] for appt in response.json], ["Termin 29"])
+
+        response = self.client.get("/appointments?from=2025-10-01 00:00&to=2025-10-07 00:00")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [])
+
+    def test_list_appointments_invalid_time_window(self):
+        response = self.client.get("/appointments?from=2025-09-22")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json["error"], "Invalid 'from' parameter. Must match %Y-%m-%d %H:%M")
+
+        response = self.client.get("/appointments?from=2025-09-28 00:00&to=2025-09-22 00:00")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json["error"], "Invalid time window: 'from' is after 'to'")
+
+    def test_recurring_appointment(self):
+        response = self.client.post("/appointments",
+                                    json = {"title": "Sport", "start": "2025-09-01 18:00", "end": "2025-09-01 19:00",
+                                            "category": "social", "recurrence": {"frequency": "weekly", "count": 10}})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json["recurrence"], {"frequency": "weekly", "count": 10})
+
+        response = self.client.post("/appointments",
+                                    json = {"title": "Arzt", "start": "2025-09-15 18:30", "end": "2025-09-15 19:30",
+                                            "category": "health"})
+        self.assertEqual(response.status_code, 409)
+
+        response = self.client.get("/appointments?from=2025-09-07 00:00&to=2025-09-16 00:00")
+        self.assertEqual([(appt["id"], appt["start"], appt["occurrence"]) for appt in response.json],
+                         [(1, "2025-09-08 18:00", 1), (1, "2025-09-15 18:00", 2)])
+        self.assertEqual(len(self.client.get("/appointments").json), 1)
+
+        response = self.client.put("/appointments/1",
+                                   json = {"title": "Sport", "start": "2025-09-01 18:00", "end": "2025-09-01 19:00",
+                                           "category": "social",
+                                           "recurrence": {"frequency": "daily", "until": "2025-09-03 00:00"}})
+        self.assertEqual(response.json["recurrence"], {"frequency": "daily", "until": "2025-09-03 00:00"})
+        self.assertNotIn("recurrence", self.client.post("/appointments/batch", json = [
+            {"title": "Arzt", "start": "2025-09-15 18:30", "end": "2025-09-15 19:30", "category": "health"}
+        ]).json[0])
+
+    def test_invalid_recurrence(self):
+        body = {"title": "Sport", "start": "2025-09-01 18:00", "end": "2025-09-01 19:00", "category": "social"}
+        for recurrence, error in (
+                ([], "Invalid recurrence: expected 'frequency' and either 'count' or 'until'"),
+                ({"frequency": "daily"}, "Invalid recurrence: expected 'frequency' and either 'count' or 'until'"),
+                ({"frequency": "daily", "count": 0}, "Invalid recurrence count. Must be a positive integer"),
+                ({"frequency": "daily", "count": True}, "Invalid recurrence count. Must be a positive integer"),
+                ({"frequency": "daily", "until": "2025-09"}, "Invalid recurrence 'until'. Must match %Y-%m-%d %H:%M"),
+                ({"frequency": "yearly", "count": 2},
+                 "Invalid recurrence frequency. Must be one of ['daily', 'weekly', 'monthly']"),
+                ({"frequency": "daily", "count": 10 ** 9}, "Invalid recurrence: the series ends after the year 9999")):
+            response = self.client.post("/appointments", json = dict(body, recurrence = recurrence))
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json["error"], error)
+
+        response = self.client.post("/appointments/batch?mode=partial", json = [
+            dict(body, recurrence = {"frequency": "daily", "count": 3}),
+            dict(body, start = "2025-09-02 18:30", end = "2025-09-02 18:45"),
+            dict(body, recurrence = {"frequency": "daily", "count": 0}),
+        ])
+        # single appointments are placed before recurring ones
+        self.assertEqual([item["status"] for item in response.json], [409, 201, 400])
+        self.assertEqual(response.json[0]["error"], "Overlapping appointment within batch")
+
+    def test_list_free_slots(self):
+        for start, end, category in (("09:00", "10:00", "work"), ("12:00", "13:00", "health")):
+            self.client.post("/appointments", json = {"title": "Termin", "start": f"2025-09-26 {start}",
+                                                      "end": f"2025-09-26 {end}", "category": category})
+
+        response = self.client.get("/appointments/free?from=2025-09-26 08:00&to=2025-09-26 18:00&duration=90")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [{"start": "2025-09-26 10:01", "end": "2025-09-26 11:59"},
+                                         {"start": "2025-09-26 13:01", "end": "2025-09-26 18:00"}])
+
+        response = self.client.get("/appointments/free?from=2025-09-26 08:00&to=2025-09-26 18:00&duration=90"
+                                   "&category=work,social")
+        self.assertEqual(response.json, [{"start": "2025-09-26 10:01", "end": "2025-09-26 18:00"}])
+
+        for query, error in (("from=2025-09-26 08:00&duration=30", "Missing time window: 'from' and 'to' are required"),
+                             ("from=2025-09-26 08:00&to=2025-09-26 18:00&duration=0",
+                              "Invalid 'duration' parameter. Must be a positive number of minutes"),
+                             ("from=2025-09-26 08:00&to=2025-09-26 18:00",
+                              "Invalid 'duration' parameter. Must be a positive number of minutes"),
+                             ("from=2025-09-26 08:00&to=2025-09-26 18:00&duration=30&category=work,sleep",
+                              f"Invalid category. Must be one of {CATEGORY_TYPES}")):
+            response = self.client.get(f"/appointments/free?{query}")
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json["error"], error)
+
+    def test_count_appointments(self):
+        for day, category in ((22, "work"), (23, "work"), (24, "health")):
+            self.client.post("/appointments",
+                             json = {"title": "Termin", "start": f"2025-09-{day} 10:00", "end": f"2025-09-{day} 11:00",
+                                     "category": category})
+        self.client.put("/appointments/2",
+                        json = {"title": "Termin", "start": "2025-09-23 10:00", "end": "2025-09-23 11:00",
+                                "category": "social"})
+        self.client.delete("/appointments/3")
+
+        response = self.client.get("/appointments/counts")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {"health": 0, "general": 0, "work": 1, "social": 1})
+
+        response = self.client.get("/appointments?category=social")
+        self.assertEqual([appt["id"] for appt in response.json], [2])
+
+    def test_metrics_disabled_by_default(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 404)
+
+    @patch.object(metrics, "enabled", True)
+    def test_metrics_endpoint(self):
+        metrics.reset()
+        self.client.post("/appointments",
+                         json = {"title": "Termin", "start": "2025-09-22 10:00", "end": "2025-09-22 11:00",
+                                 "category": "work"})
+        self.client.get("/appointments")
+
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain; version=0.0.4"))
+        text = response.get_data(as_text = True)
+        self.assertIn('appointments_request_seconds_count{route="POST /appointments"} 1', text)
+        self.assertIn('appointments_request_seconds_count{route="GET /appointments"} 1', text)
+        for phase in ("validate", "overlap", "jsonify"):
+            self.assertIn(f'appointments_phase_seconds_count{{route="POST /appointments",phase="{phase}"}} 1', text)
+        self.assertIn('appointments_phase_seconds_count{route="GET /appointments",phase="serialize"} 1', text)
+        self.assertIn("appointments_store_size 1\n", text)
+        self.assertIn('appointments_store_category_size{category="work"} 1\n', text)
+
+    def test_list_appointments_etag(self):
+        self.client.post("/appointments",
+                         json = {"title": "Meeting", "start": "2025-09-26 10:00", "end": "2025-09-26 12:00",
+                                 "category": "general"})
+        response = self.client.get("/appointments")
+        etag = response.headers["ETag"]
+
+        response = self.client.get("/appointments", headers = {"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+
+        self.client.put("/appointments/1",
+                        json = {"title": "Meeting neu", "start": "2025-09-26 10:00", "end": "2025-09-26 12:00",
+                                "category": "general"})
+        response = self.client.get("/appointments", headers = {"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(response.json[0]["title"], "Meeting neu")
+
+    @patch("api.serialize_datetime_format", wraps = serialize_datetime_format)
+    def test_list_appointments_reuses_serialization(self, mock_serialize):
+        self.client.post("/appointments",
+                         json = {"title": "Meeting", "start": "2025-09-26 10:00", "end": "2025-09-26 12:00",
+                                 "category": "general"})
+        self.client.post("/appointments",
+                         json = {"title": "Meeting2", "start": "2025-09-26 13:00", "end": "2025-09-26 14:00",
+                                 "category": "general"})
+        self.client.get("/appointments")
+        self.client.get("/appointments?category=general")
+        self.client.delete("/appointments/2")
+        response = self.client.get("/appointments")
+
+        self.assertEqual(len(response.json), 1)
+        self.assertEqual(mock_serialize.call_count, 4)
+
+    def test_create_appointments_batch(self):
+        self.client.post("/appointments",
+                         json = {"title": "Meeting", "start": "2025-09-26 10:00", "end": "2025-09-26 12:00",
+                                 "category": "general"})
+        response = self.client.post("/appointments/batch",
+                                    json = [{"title": "B", "start": "2025-09-27 10:00", "end": "2025-09-27 11:00",
+                                             "category": "work"},
+                                            {"title": "A", "start": "2025-09-25 10:00", "end": "2025-09-25 11:00",
+                                             "category": "health"}])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([(appt["id"], appt["title"]) for appt in response.json], [(2, "B"), (3, "A")])
+        self.assertEqual(len(appointments), 3)
+
+    def test_create_appointments_batch_atomic_conflict(self):
+        self.client.post("/appointments",
+                         json = {"title": "Meeting", "start": "2025-09-26 10:00", "end": "2025-09-26 12:00",
+                                 "category": "general"})
+        response = self.client.post("/appointments/batch",
+                                    json = [{"title": "A", "start": "2025-09-27 10:00", "end": "2025-09-27 11:00",
+                                             "category": "work"},
+                                            {"title": "B", "start": "2025-09-26 11:00", "end": "2025-09-26 13:00",
+                                             "category": "work"},
+                                            {"title": "C", "start": "2025-09-27 10:30", "end": "2025-09-27 12:00",
+                                             "category": "work"}])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json["items"],
+                         [{"index": 1, "status": 409, "error": "Overlapping appointment"},
+                          {"index": 2, "status": 409, "error": "Overlapping appointment within batch"}])
+        self.assertEqual(len(appointments), 1)
+
+    def test_create_appointments_batch_atomic_invalid(self):
+        response = self.client.post("/appointments/batch",
+                                    json = [{"title": "A", "start": "2025-09-27 10:00", "end": "2025-09-27 11:00",
+                                             "category": "work"},
+                                            {"title": "B", "start": "2025-09-26 11:00", "end": "2025-09-26 13:00",
+                                             "category": "party"}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json["items"],
+                         [{"index": 1, "status": 400, "error": f"Invalid category. Must be one of {CATEGORY_TYPES}"}])
+        self.assertEqual(len(appointments), 0)
+
+    def test_create_appointments_batch_partial(self):
+        self.client.post("/appointments",
+                         json = {"title": "Meeting", "start": "2025-09-26 10:00", "end": "2025-09-26 12:00",
+                                 "category": "general"})
+        response = self.client.post("/appointments/batch?mode=partial",
+                                    json = [{"title": "A", "start": "2025-09-26 11:00", "end": "2025-09-26 13:00",
+                                             "category": "work"},
+                                            {"title": "B"},
+                                            {"title": "C", "start": "2025-09-27 10:30", "end": "2025-09-27 12:00",
+                                             "category": "work"}])
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([result["status"] for result in response.json], [409, 400, 201])
+        self.assertEqual(response.json[2]["appointment"]["id"], 2)
+        self.assertEqual([appt.title for appt in appointments], ["Meeting", "C"])
+
+    def test_create_appointments_batch_invalid_request(self):
+        response = self.client.post("/appointments/batch", json = {"title": "A"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json["error"], "Invalid batch: expected a list of appointments")
+
+        response = self.client.post("/appointments/batch?mode=some", json = [])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json["error"], "Invalid mode. Must be one of ['atomic', 'partial']")
+
+    def test_list_appointments_stream(self):
+        for day, category in ((22, "work"), (23, "health"), (24, "work")):
+            self.client.post("/appointments",
+                             json = {"title": f"Termin {day}", "start": f"2025-09-{day} 10:00",
+                                     "end": f"2025-09-{day} 11:00", "category": category})
+
+        response = self.client.get("/appointments?stream=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lines = [json.loads(line) for line in response.get_data(as_text = True).splitlines()]
+        self.assertEqual(lines, self.client.get("/appointments").json)
+
+        response = self.client.get("/appointments?category=work", headers = {"Accept": "application/x-ndjson"})
+        lines = [json.loads(line) for line in response.get_data(as_text = True).splitlines()]
+        self.assertEqual([line["title"] for line in lines], ["Termin 22", "Termin 24"])
+
+    def test_list_appointments_pages(self):
+        for day in range(1, 8):
+            self.client.post("/appointments",
+                             json = {"title": f"Termin {day}", "start": f"2025-09-{day:02} 10:00",
+                                     "end": f"2025-09-{day:02} 11:00", "category": "work" if day % 2 else "health"})
+
+        titles, url = [], "/appointments?limit=3"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            titles.append([appt["title"] for appt in response.json])
+            # appointments created or deleted behind the cursor do not shift later pages
+            self.client.delete("/appointments/1")
+            url = response.headers.get("Link", "<>")[1:].split(">")[0]
+        self.assertEqual(titles, [["Termin 1", "Termin 2", "Termin 3"], ["Termin 4", "Termin 5", "Termin 6"],
+                                  ["Termin 7"]])
+
+        response = self.client.get("/appointments?limit=2&category=work")
+        self.assertEqual([appt["title"] for appt in response.json], ["Termin 3", "Termin 5"])
+        response = self.client.get(response.headers["Link"][1:].split(">")[0])
+        self.assertEqual([appt["title"] for appt in response.json], ["Termin 7"])
+        self.assertNotIn("Link", response.headers)
+        etag = response.headers["ETag"]
+        self.assertEqual(self.client.get(response.request.full_path, headers = {"If-None-Match": etag}).status_code,
+                         304)
+
+        response = self.client.get("/appointments?limit=2&from=2025-09-03 10:30&to=2025-09-30 00:00&stream=1")
+        self.assertEqual([json.loads(line)["title"] for line in response.get_data(as_text = True).splitlines()],
+                         ["Termin 3", "Termin 4"])
+        response = self.client.get(response.headers["Link"][1:].split(">")[0])
+        self.assertEqual([json.loads(line)["title"] for line in response.get_data(as_text = True).splitlines()],
+                         ["Termin 5", "Termin 6"])
+
+    def test_list_appointments_invalid_page(self):
+        limit_error = "Invalid 'limit' parameter. Must be an integer from 1 to 1000"
+        huge_cursor = base64.urlsafe_b64encode(b"99999999999999999999").decode()
+        for query, error in (("limit=0", limit_error),
+                             ("limit=x", limit_error),
+                             ("limit=1001", limit_error),
+                             ("limit=99999999999999999999", limit_error),
+                             ("limit=1000", None),
+                             (f"limit=2&cursor={huge_cursor}", "Invalid 'cursor' parameter"),
+                             ("cursor=nope", "Invalid 'cursor' parameter"),
+                             ("limit=2&cursor=MTAsMw&from=2025-09-01 00:00", None),
+                             ("limit=2&cursor=MTAsMw", "Invalid 'cursor' parameter")):
+            response = self.client.get(f"/appointments?{query}")
+            if error is None:
+                self.assertEqual(response.status_code, 200)
+                continue
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json["error"], error)
+
+    def test_list_appointments_stream_errors(self):
+        response = self.client.get("/appointments?stream=1&category=health")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json["error"], "No appointments found for this category")
+
+        response = self.client.get("/appointments?stream=1&from=morgen")
+        self.assertEqual(response.status_code, 400)
+
+    def test_concurrent_requests_keep_store_consistent(self):
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        start = threading.Barrier(6)
+        statuses = []
+
+        def worker(number):
+            client = app.test_client()
+            start.wait()
+            for day in range(1, 11):
+                response = client.post("/appointments",
+                                       json = {"title": f"Worker {number}", "start": f"2025-10-{day:02d} 10:00",
+                                               "end": f"2025-10-{day:02d} 11:00", "category": "work"})
+                statuses.append(response.status_code)
+                client.get("/appointments")
+
+        try:
+            threads = [threading.Thread(target = worker, args = (number,)) for number in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        self.assertEqual(statuses.count(201), 10)
+        self.assertEqual(statuses.count(409), 50)
+        ids = [appt["id"] for appt in self.client.get("/appointments").json]
+        self.assertEqual(sorted(ids), list(range(1, 11)))
+        stored = sorted((appt.start, appt.end) for appt in appointments)
+        for (_, previous_end), (next_start, _) in zip(stored, stored[1:]):
+            self.assertLess(previous_end, next_start)
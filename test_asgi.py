@@ -0,0 +1,158 @@
+import asyncio
+import json
+import threading
+import unittest
+from unittest.mock import patch
+
+from api import appointments
+from asgi import app
+
+
+async def call(method, path, payload = None, query = b"", headers = (), body = None):
+    if body is None:
+        body = b"" if payload is None else json.dumps(payload).encode()
+    scope = {"type": "http", "method": method, "path": path, "query_string": query,
+             "headers": [(name.encode(), value.encode()) for name, value in headers]}
+    incoming = [{"type": "http.request", "body": body}]
+    messages = []
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = messages[0]
+    response_headers = {name.decode(): value.decode() for name, value in start["headers"]}
+    return start["status"], b"".join(message.get("body", b"") for message in messages[1:]), response_headers
+
+
+def request(method, path, payload = None, query = b"", headers = (), body = None):
+    status, body, response_headers = asyncio.run(call(method, path, payload, query, headers, body))
+    if body and response_headers.get("content-type") == "application/json":
+        body = json.loads(body)
+    return status, body, response_headers
+
+
+class TestAsgi(unittest.TestCase):
+
+    def setUp(self):
+        appointments.clear()
+
+    def test_create_and_list(self):
+        status, created, _ = request("POST", "/appointments",
+                                     {"title": "Meeting", "start": "2025-09-26 10:00", "end": "2025-09-26 12:00",
+                                      "category": "work"})
+        self.assertEqual(status, 201)
+        self.assertEqual(created, {"id": 1, "title": "Meeting", "start": "2025-09-26 10:00",
+                                   "end": "2025-09-26 12:00", "category": "work"})
+
+        status, listed, headers = request("GET", "/appointments")
+        self.assertEqual(status, 200)
+        self.assertEqual(listed, [created])
+
+        status, _, _ = request("GET", "/appointments", headers = [("If-None-Match", headers["etag"])])
+        self.assertEqual(status, 304)
+
+    def test_errors_match_flask_contract(self):
+        status, body, _ = request("POST", "/appointments", {"title": "Meeting"})
+        self.assertEqual((status, body), (400, {"error": "Invalid appointment: wrong or missing fields"}))
+
+        request("POST", "/appointments", {"title": "A", "start": "2025-09-26 10:00", "end": "2025-09-26 12:00",
+                                          "category": "work"})
+        status, body, _ = request("POST", "/appointments", {"title": "B", "start": "2025-09-26 11:00",
+                                                            "end": "2025-09-26 13:00", "category": "work"})
+        self.assertEqual((status, body), (409, {"error": "Overlapping appointment"}))
+
+        status, body, _ = request("GET", "/appointments", query = b"category=unknown")
+        self.assertEqual(status, 200)
+        self.assertIn("Invalid category", body["error"])
+
+        self.assertEqual(request("DELETE", "/appointments/9")[0], 404)
+        self.assertEqual(request("GET", "/nothing")[0], 404)
+        self.assertEqual(request("PATCH", "/appointments/1")[0], 405)
+
+    def test_malformed_json_body(self):
+        for method, path in (("POST", "/appointments"), ("POST", "/appointments/batch"), ("PUT", "/appointments/1")):
+            status, body, _ = request(method, path, body = b'{"title": ')
+            self.assertEqual((status, body), (400, {"error": "Invalid JSON body"}))
+        self.assertEqual(len(appointments), 0)
+
+    def test_accept_header_negotiation(self):
+        request("POST", "/appointments", {"title": "A", "start": "2025-09-26 10:00", "end": "2025-09-26 12:00",
+                                          "category": "work"})
+        for accept, mimetype in (("application/x-ndjson", "application/x-ndjson"),
+                                 ("application/json, application/x-ndjson;q=0.1", "application/json"),
+                                 ("application/json;q=0.5, application/x-ndjson", "application/x-ndjson"),
+                                 ("application/x-ndjson;q=0", "application/json"),
+                                 ("*/*", "application/json")):
+            status, _, headers = request("GET", "/appointments", headers = [("Accept", accept)])
+            self.assertEqual((status, headers["content-type"]), (200, mimetype), accept)
+
+    def test_update_shift_delete(self):
+        request("POST", "/appointments", {"title": "A", "start": "2025-09-26 10:00", "end": "2025-09-26 12:00",
+                                          "category": "work"})
+
+        status, body, _ = request("PUT", "/appointments/1", {"title": "B", "start": "2025-09-26 11:00",
+                                                             "end": "2025-09-26 13:00", "category": "general"})
+        self.assertEqual((status, body["title"]), (200, "B"))
+
+        status, body, _ = request("POST", "/appointments/shift/1", query = b"amount_start=1&amount_end=1")
+        self.assertEqual((status, body["start"]), (200, "2025-09-27 11:00"))
+        self.assertEqual(request("POST", "/appointments/shift/1", query = b"amount_start=x")[0], 400)
+
+        self.assertEqual(request("DELETE", "/appointments/1")[1], {"status": "deleted"})
+        self.assertEqual(len(appointments), 0)
+
+    def test_batch_and_stream(self):
+        status, body, _ = request("POST", "/appointments/batch",
+                                  [{"title": f"T{i}", "start": f"2025-09-26 1{i}:00", "end": f"2025-09-26 1{i}:30",
+                                    "category": "work"} for i in range(3)])
+        self.assertEqual((status, len(body)), (201, 3))
+
+        status, body, headers = request("GET", "/appointments", query = b"stream=1")
+        self.assertEqual(headers["content-type"], "application/x-ndjson")
+        self.assertEqual([json.loads(line)["title"] for line in body.splitlines()], ["T0", "T1", "T2"])
+
+        status, body, headers = request("GET", "/appointments", query = b"limit=2")
+        self.assertEqual([appt["title"] for appt in body], ["T0", "T1"])
+        path, query = headers["link"][1:].split(">")[0].split("?")
+        self.assertEqual([appt["title"] for appt in request("GET", path, query = query.encode())[1]], ["T2"])
+
+    def test_stream_serializes_outside_the_event_loop(self):
+        request("POST", "/appointments/batch", [{"title": f"T{i}", "start": f"2025-09-26 1{i}:00",
+                                                 "end": f"2025-09-26 1{i}:30", "category": "work"} for i in range(3)])
+        threads = []
+        serialized = appointments.serialized
+
+        def record_thread(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return serialized(*args, **kwargs)
+
+        with patch.object(appointments, "serialized", record_thread):
+            status, body, _ = request("GET", "/appointments", query = b"stream=1")
+
+        self.assertEqual((status, len(body.splitlines())), (200, 3))
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn(threading.main_thread(), threads)
+
+    def test_free_slots(self):
+        request("POST", "/appointments", {"title": "A", "start": "2025-09-26 10:00", "end": "2025-09-26 12:00",
+                                          "category": "work"})
+
+        status, body, _ = request("GET", "/appointments/free",
+                                  query = b"from=2025-09-26%2009:00&to=2025-09-26%2013:00&duration=30")
+        self.assertEqual(status, 200)
+        self.assertEqual(body, [{"start": "2025-09-26 09:00", "end": "2025-09-26 09:59"},
+                                {"start": "2025-09-26 12:01", "end": "2025-09-26 13:00"}])
+
+    def test_concurrent_creates_never_double_book(self):
+        async def book_all():
+            payload = {"title": "Slot", "start": "2025-09-26 10:00", "end": "2025-09-26 11:00", "category": "work"}
+            return await asyncio.gather(*(call("POST", "/appointments", payload) for _ in range(20)))
+
+        statuses = sorted(status for status, _, _ in asyncio.run(book_all()))
+
+        self.assertEqual(statuses, [201] + [409] * 19)
+        self.assertEqual(len(appointments), 1)
@@ -0,0 +1,72 @@
+import threading
+import unittest
+
+from locking import ReadWriteLock
+
+
+class TestReadWriteLock(unittest.TestCase):
+
+    def setUp(self):
+        self.lock = ReadWriteLock()
+
+    def test_readers_share_the_lock(self):
+        inside = threading.Barrier(3, timeout = 5)
+
+        def reader():
+            with self.lock.reading():
+                inside.wait()
+
+        threads = [threading.Thread(target = reader) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        inside.wait()
+        for thread in threads:
+            thread.join()
+
+    def test_writer_excludes_readers(self):
+        events = []
+        writer_inside = threading.Event()
+        release_writer = threading.Event()
+
+        def writer():
+            with self.lock.writing():
+                writer_inside.set()
+                release_writer.wait(5)
+                events.append("writer done")
+
+        def reader():
+            with self.lock.reading():
+                events.append("reader")
+
+        writer_thread = threading.Thread(target = writer)
+        writer_thread.start()
+        writer_inside.wait(5)
+        reader_thread = threading.Thread(target = reader)
+        reader_thread.start()
+        reader_thread.join(0.05)
+        self.assertEqual(events, [])
+
+        release_writer.set()
+        writer_thread.join()
+        reader_thread.join()
+        self.assertEqual(events, ["writer done", "reader"])
+
+    def test_reentrant(self):
+        with self.lock.writing():
+            with self.lock.writing():
+                with self.lock.reading():
+                    self.assertTrue(self.lock.is_writing())
+            self.assertTrue(self.lock.is_writing())
+        self.assertFalse(self.lock.is_writing())
+
+        with self.lock.reading():
+            with self.lock.reading():
+                pass
+        with self.lock.writing():
+            pass
+
+    def test_upgrade_is_rejected(self):
+        with self.lock.reading():
+            with self.assertRaises(RuntimeError):
+                with self.lock.writing():
+                    pass
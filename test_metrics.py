@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+
+from metrics import Metrics, PROFILE_KEEP
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics(enabled = True)
+
+    def test_histogram_buckets_are_cumulative(self):
+        for seconds in (0.00005, 0.0003, 0.0003, 10.0):
+            self.metrics.observe(self.metrics.requests, ("GET /appointments",), seconds)
+
+        lines = self.metrics.render().splitlines()
+
+        self.assertIn("# TYPE appointments_request_seconds histogram", lines)
+        self.assertIn('appointments_request_seconds_bucket{route="GET /appointments",le="0.0001"} 1', lines)
+        self.assertIn('appointments_request_seconds_bucket{route="GET /appointments",le="0.0005"} 3', lines)
+        self.assertIn('appointments_request_seconds_bucket{route="GET /appointments",le="5.0"} 3', lines)
+        self.assertIn('appointments_request_seconds_bucket{route="GET /appointments",le="+Inf"} 4', lines)
+        self.assertIn('appointments_request_seconds_count{route="GET /appointments"} 4', lines)
+
+    def test_phases_belong_to_the_current_request(self):
+        @self.metrics.timed("validate")
+        def validate():
+            return "ok"
+
+        self.metrics.begin("POST /appointments")
+        self.assertEqual(validate(), "ok")
+        with self.metrics.phase("serialize"):
+            pass
+        self.metrics.end()
+        validate()
+
+        self.assertEqual(sorted(self.metrics.phases), [("POST /appointments", "serialize"),
+                                                       ("POST /appointments", "validate"), ("none", "validate")])
+        self.assertEqual(self.metrics.requests[("POST /appointments",)].count, 1)
+
+    def test_disabled_metrics_record_nothing(self):
+        self.metrics.enabled = False
+
+        @self.metrics.timed("validate")
+        def validate():
+            return "ok"
+
+        self.assertEqual(validate(), "ok")
+        with self.metrics.phase("serialize"):
+            pass
+        self.assertEqual(self.metrics.phases, {})
+
+    def test_gauges_and_label_escaping(self):
+        text = self.metrics.render([("appointments_store_size", "Stored appointments", [({}, 3)]),
+                                    ("appointments_store_category_size", "Per category",
+                                     [({"category": 'a"b\\c'}, 1)])])
+
+        self.assertIn("# TYPE appointments_store_size gauge\nappointments_store_size 3\n", text)
+        self.assertIn('appointments_store_category_size{category="a\\"b\\\\c"} 1', text)
+
+    def test_profiler_keeps_slowest_requests(self):
+        with tempfile.TemporaryDirectory() as profile_dir:
+            self.metrics.profile_dir = profile_dir
+            self.metrics.profile_every = 1
+            for _ in range(PROFILE_KEEP + 3):
+                self.metrics.begin("GET /appointments")
+                sum(range(1000))
+                self.metrics.end()
+
+            kept = self.metrics.slowest_profiles()
+            self.assertEqual(len(kept), PROFILE_KEEP)
+            self.assertEqual(sorted(os.listdir(profile_dir)), sorted(os.path.basename(path) for path in kept))
@@ -0,0 +1,126 @@
+import os
+import tempfile
+import unittest
+
+from persistence import JOURNAL_NAME, SNAPSHOT_NAME, load_snapshot, restore, write_snapshot
+from store import Appointment, AppointmentStore, Recurrence
+
+
+def snapshot_of(store):
+    return [(appt.id, appt.title, appt.start, appt.end, appt.category, appt.recurrence) for appt in store]
+
+
+class TestPersistence(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmp.name
+        self.store = AppointmentStore()
+        restore(self.store, self.data_dir)
+
+    def tearDown(self):
+        self.store.journal.close()
+        self.tmp.cleanup()
+
+    def reopen(self, compact_bytes = 1024 * 1024):
+        self.store.journal.close()
+        self.store = AppointmentStore()
+        return restore(self.store, self.data_dir, compact_bytes)
+
+    def test_restore_replays_journal(self):
+        first = self.store.add("Arzt", 100, 160, "health")
+        second = self.store.add("Meeting", 200, 260, "work")
+        self.store.add("Sport", 300, 360, "social")
+        self.store.update(first, title = "Zahnarzt", start = 110, end = 170)
+        self.store.update(second, category = "general")
+        self.store.delete(3)
+        expected = snapshot_of(self.store)
+
+        restored = self.reopen()
+
+        self.assertEqual(restored["appointments"], 2)
+        self.assertEqual(restored["replayed"], 6)
+        self.assertEqual(snapshot_of(self.store), expected)
+        self.assertEqual(self.store.add("Neu", 400, 460, "work").id, 4)
+        self.assertIs(self.store.find_overlap(150, 155), self.store.get(1))
+
+    def test_restore_after_clear(self):
+        self.store.add("Arzt", 100, 160, "health")
+        self.store.clear()
+        self.store.add("Meeting", 200, 260, "work")
+
+        self.reopen()
+
+        self.assertEqual(snapshot_of(self.store), [(1, "Meeting", 200, 260, "work", None)])
+
+    def test_snapshot_roundtrip(self):
+        appts = [Appointment(i, f"Termin {i} ü\U0001f600", i * 100, i * 100 + 30, ["work", "health"][i % 2])
+                 for i in range(1, 50)]
+        self.store.extend(appts)
+        self.store.next_id = 80
+        path = os.path.join(self.data_dir, "copy.bin")
+
+        write_snapshot(self.store, path)
+        next_id, loaded = load_snapshot(path)
+
+        self.assertEqual(next_id, 80)
+        self.assertEqual([(a.id, a.title, a.start, a.end, a.category, a.recurrence) for a in loaded],
+                         snapshot_of(self.store))
+
+    def test_recurrence_survives_journal_and_snapshot(self):
+        weekly = self.store.add("Sport", 100, 160, "social", Recurrence("weekly", 5, None))
+        self.store.add("Miete", 200, 230, "general", Recurrence("monthly", None, 100000))
+        self.store.add("Arzt", 300, 330, "health")
+        self.store.update(weekly, recurrence = Recurrence("daily", 3, None))
+        expected = snapshot_of(self.store)
+
+        self.reopen()
+        self.assertEqual(snapshot_of(self.store), expected)
+
+        path = os.path.join(self.data_dir, "copy.bin")
+        write_snapshot(self.store, path)
+        _, loaded = load_snapshot(path)
+        self.assertEqual([(a.id, a.title, a.start, a.end, a.category, a.recurrence) for a in loaded], expected)
+        self.assertEqual(self.store.find_overlap(100 + 2 * 1440, 100 + 2 * 1440 + 10).id, 1)
+
+    def test_compaction_truncates_journal(self):
+        self.reopen(compact_bytes = 500)
+        for i in range(20):
+            self.store.add(f"Termin {i}", i * 100, i * 100 + 30, "work")
+        self.store.delete(20)
+        expected = snapshot_of(self.store)
+
+        self.assertTrue(os.path.exists(os.path.join(self.data_dir, SNAPSHOT_NAME)))
+        self.assertLess(os.path.getsize(os.path.join(self.data_dir, JOURNAL_NAME)), 500)
+
+        restored = self.reopen()
+
+        self.assertLess(restored["replayed"], 20)
+        self.assertEqual(snapshot_of(self.store), expected)
+        self.assertEqual(self.store.add("Neu", 5000, 5030, "work").id, 21)
+
+    def test_compaction_keeps_titles_that_are_not_strings(self):
+        self.reopen(compact_bytes = 200)
+        for i, title in enumerate([None, 42, 1.5, True, {"de": "Arzt"}, ["a", 1], "Termin ü"] * 3):
+            self.store.add(title, i * 100, i * 100 + 30, "work")
+        expected = snapshot_of(self.store)
+
+        self.assertTrue(os.path.exists(os.path.join(self.data_dir, SNAPSHOT_NAME)))
+        self.reopen()
+
+        self.assertEqual(snapshot_of(self.store), expected)
+        self.assertEqual([type(appt.title) for appt in self.store][:4], [type(None), int, float, bool])
+
+    def test_torn_journal_tail_is_dropped(self):
+        self.store.add("Arzt", 100, 160, "health")
+        journal_path = os.path.join(self.data_dir, JOURNAL_NAME)
+        with open(journal_path, "ab") as f:
+            f.write(b'{"op": "put", "id": 2, "ti')
+
+        restored = self.reopen()
+
+        self.assertEqual(restored["replayed"], 1)
+        self.assertEqual(snapshot_of(self.store), [(1, "Arzt", 100, 160, "health", None)])
+        self.store.add("Meeting", 200, 260, "work")
+        self.reopen()
+        self.assertEqual(len(self.store), 2)
@@ -0,0 +1,199 @@
+import base64
+import multiprocessing
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import api
+from sqlite_store import SqliteStore
+from store import Appointment, AppointmentNotFound, AppointmentOverlap, Recurrence
+
+SLOTS = 60
+WORKERS = 4
+
+
+def snapshot_of(store):
+    return [(appt.id, appt.title, appt.start, appt.end, appt.category) for appt in store]
+
+
+def book_every_slot(path, results):
+    store = SqliteStore(path)
+    booked = 0
+    for slot in range(SLOTS):
+        try:
+            store.create(f"Termin {os.getpid()}", slot * 100, slot * 100 + 30, "work")
+            booked += 1
+        except AppointmentOverlap:
+            pass
+    results.put(booked)
+
+
+class TestSqliteStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "appointments.db")
+        self.store = SqliteStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_add_get_and_list(self):
+        first = self.store.add("Arzt", 100, 160, "health")
+        second = self.store.add("Meeting", 200, 260, "work")
+
+        self.assertEqual((first.id, second.id), (1, 2))
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(self.store[-1].title, "Meeting")
+        self.assertEqual(self.store.get(1).title, "Arzt")
+        self.assertIsNone(self.store.get(3))
+        self.assertEqual([appt.id for appt in self.store.by_category("work")], [2])
+        self.assertEqual(self.store.count("health"), 1)
+
+    def test_find_overlap(self):
+        self.store.add("Lang", 0, 1000, "work")
+        self.store.add("Kurz", 2000, 2030, "work")
+
+        self.assertEqual(self.store.find_overlap(900, 950).id, 1)
+        self.assertEqual(self.store.find_overlap(1000, 1100).id, 1)
+        self.assertIsNone(self.store.find_overlap(1000, 1100, inclusive = False))
+        self.assertIsNone(self.store.find_overlap(500, 600, exclude_id = 1))
+        self.assertEqual([appt.id for appt in self.store.query_range(1500, 2010)], [2])
+
+    def test_checked_operations(self):
+        appt = self.store.create("Arzt", 100, 160, "health")
+        with self.assertRaises(AppointmentOverlap):
+            self.store.create("Meeting", 150, 200, "work")
+        with self.assertRaises(AppointmentNotFound):
+            self.store.replace(9, "Meeting", 300, 360, "work")
+
+        self.store.shift(appt.id, 60, 60)
+        self.store.replace(appt.id, "Zahnarzt", 160, 220, "general")
+
+        self.assertEqual(snapshot_of(self.store), [(1, "Zahnarzt", 160, 220, "general")])
+        self.assertEqual(len(self.store), 1)
+
+    def test_failed_transaction_rolls_back(self):
+        with self.assertRaises(RuntimeError):
+            with self.store.transaction():
+                self.store.add("Arzt", 100, 160, "health")
+                raise RuntimeError("abort")
+
+        self.assertEqual(len(self.store), 0)
+        self.assertEqual(self.store.add("Meeting", 200, 260, "work").id, 1)
+
+    def test_duplicate_ids_are_rejected_atomically(self):
+        with self.assertRaises(ValueError):
+            self.store.extend([Appointment(1, "A", 0, 10, "work"), Appointment(1, "B", 20, 30, "work")])
+
+        self.assertEqual(len(self.store), 0)
+
+    def test_batch_conflicts(self):
+        self.store.add("Arzt", 100, 160, "health")
+        conflicts, created = self.store.add_batch([("A", 300, 330, "work"), ("B", 150, 200, "work"),
+                                                   ("C", 320, 340, "work")], atomic = False)
+
+        self.assertIsNone(conflicts[0])
+        self.assertEqual(conflicts[1][0], "store")
+        self.assertEqual(conflicts[2], ("batch", 0))
+        self.assertEqual([appt and appt.id for appt in created], [2, None, None])
+
+    def test_recurring_appointments(self):
+        weekly = self.store.create("Sport", 100, 160, "social", Recurrence("weekly", None, 100 + 3 * 10080))
+        self.store.add("Arzt", 400, 460, "health")
+
+        with self.assertRaises(AppointmentOverlap):
+            self.store.create("Kurs", 100 + 2 * 10080 + 30, 100 + 2 * 10080 + 90, "work")
+        self.assertEqual(self.store.get(1).recurrence, weekly.recurrence)
+        self.assertEqual([appt.id for appt in self.store.series()], [1])
+        self.assertEqual([(appt.id, appt.start) for appt in self.store.query_range(300, 100 + 10080)],
+                         [(2, 400), (1, 100 + 10080)])
+
+        self.store.update(weekly, recurrence = None)
+        self.assertIsNone(SqliteStore(self.path).get(1).recurrence)
+        self.assertEqual(self.store.series(), [])
+
+    def test_pages(self):
+        for i in range(5):
+            self.store.add(f"Termin {i}", 1000 - i * 100, 1030 - i * 100, ["work", "health"][i % 2])
+        self.store.add("Serie", 50, 60, "work", Recurrence("daily", 2, None))
+
+        self.assertEqual([appt.id for appt in self.store.id_page(1, 2)], [2, 3])
+        self.assertEqual([appt.id for appt in self.store.id_page(1, 5, "work")], [3, 5, 6])
+        self.assertEqual([appt.id for appt in self.store.start_page((600, 5), 3)], [4, 3, 2])
+        self.assertEqual([(appt.id, appt.start) for appt in self.store.query_page(None, None, (700, 4), 4)],
+                         [(3, 800), (2, 900), (1, 1000), (6, 50 + 1440)])
+
+    def test_state_is_shared_between_instances(self):
+        self.store.add("Arzt", 100, 160, "health")
+        other = SqliteStore(self.path)
+        version = other.version
+
+        other.delete(1)
+        self.assertEqual(len(self.store), 0)
+        self.assertEqual(self.store.epoch, other.epoch)
+        self.assertGreater(self.store.version, version)
+
+        self.store.clear()
+        self.assertEqual(other.add("Meeting", 200, 260, "work").id, 1)
+        other.close()
+
+    def test_processes_never_double_book(self):
+        results = multiprocessing.get_context("fork").Queue()
+        workers = [multiprocessing.get_context("fork").Process(target = book_every_slot, args = (self.path, results))
+                   for _ in range(WORKERS)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(sum(results.get() for _ in workers), SLOTS)
+        appts = list(self.store)
+        self.assertEqual(len(appts), SLOTS)
+        self.assertEqual(sorted(appt.start for appt in appts), [slot * 100 for slot in range(SLOTS)])
+
+    def test_api_uses_sqlite_store(self):
+        with patch("api.appointments", self.store):
+            client = api.app.test_client()
+            created = client.post("/appointments", json = {"title": "Meeting", "start": "2025-09-26 10:00",
+                                                           "end": "2025-09-26 12:00", "category": "work"})
+            conflict = client.post("/appointments", json = {"title": "Meeting", "start": "2025-09-26 11:00",
+                                                            "end": "2025-09-26 13:00", "category": "work"})
+            listed = client.get("/appointments?category=work")
+
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(conflict.status_code, 409)
+        self.assertEqual([appt["title"] for appt in listed.json], ["Meeting"])
+
+    def test_api_keeps_title_types(self):
+        titles = [None, 42, 1.5, True, {"de": "Arzt"}, ["a", 1], "Termin"]
+        with patch("api.appointments", self.store):
+            client = api.app.test_client()
+            created = [client.post("/appointments", json = {"title": title, "start": f"2025-09-{day:02} 10:00",
+                                                            "end": f"2025-09-{day:02} 11:00", "category": "work"})
+                       for day, title in enumerate(titles, start = 1)]
+            updated = client.put("/appointments/2", json = {"title": None, "start": "2025-09-02 10:00",
+                                                             "end": "2025-09-02 11:00", "category": "work"})
+            listed = client.get("/appointments")
+
+        self.assertEqual([response.status_code for response in created], [201] * len(titles))
+        self.assertEqual([response.json["title"] for response in created], titles)
+        self.assertEqual(updated.status_code, 200)
+        self.assertEqual([appt["title"] for appt in listed.json], [None, None] + titles[2:])
+
+    def test_api_rejects_out_of_range_pages(self):
+        self.store.add("Arzt", 100, 160, "health")
+        huge_cursor = base64.urlsafe_b64encode(b"99999999999999999999").decode()
+        with patch("api.appointments", self.store):
+            client = api.app.test_client()
+            statuses = [client.get(f"/appointments?{query}").status_code
+                        for query in ("limit=99999999999999999999", f"limit=2&cursor={huge_cursor}", "limit=1000")]
+
+        self.assertEqual(statuses, [400, 400, 200])
+
+    def test_create_store_from_url(self):
+        self.assertIsInstance(api.create_store(f"sqlite:///{self.path}"), SqliteStore)
+        with self.assertRaises(ValueError):
+            api.create_store("postgres://localhost/appointments")
@@ -0,0 +1,412 @@
+import sys
+import threading
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from store import Appointment, AppointmentBackend, AppointmentNotFound, AppointmentOverlap, AppointmentStore, \
+    Recurrence, to_minutes, validate_recurrence
+
+
+def minutes(*args):
+    return to_minutes(datetime(*args))
+
+
+def make_appointment(appt_id, start, end, category = "general"):
+    return Appointment(appt_id, f"Termin {appt_id}", start, end, category)
+
+
+class TestAppointmentStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = AppointmentStore()
+
+    def test_find_overlap_empty_store(self):
+        self.assertIsNone(self.store.find_overlap(minutes(2025, 9, 26, 10, 0), minutes(2025, 9, 26, 12, 0)))
+
+    def test_find_overlap_inclusive_touching(self):
+        appt = make_appointment(1, minutes(2025, 9, 26, 10, 0), minutes(2025, 9, 26, 12, 0))
+        self.store.append(appt)
+
+        self.assertIs(self.store.find_overlap(minutes(2025, 9, 26, 12, 0), minutes(2025, 9, 26, 13, 0)), appt)
+        self.assertIs(self.store.find_overlap(minutes(2025, 9, 26, 9, 0), minutes(2025, 9, 26, 10, 0)), appt)
+
+    def test_find_overlap_exclusive_touching(self):
+        self.store.append(make_appointment(1, minutes(2025, 9, 26, 10, 0), minutes(2025, 9, 26, 12, 0)))
+
+        self.assertIsNone(self.store.find_overlap(minutes(2025, 9, 26, 12, 0), minutes(2025, 9, 26, 13, 0),
+                                                  inclusive = False))
+        self.assertIsNone(self.store.find_overlap(minutes(2025, 9, 26, 9, 0), minutes(2025, 9, 26, 10, 0),
+                                                  inclusive = False))
+
+    def test_find_overlap_long_appointment_started_earlier(self):
+        long_appt = make_appointment(1, minutes(2025, 9, 1, 0, 0), minutes(2025, 9, 30, 0, 0))
+        self.store.append(long_appt)
+        for day in range(2, 10):
+            self.store.append(make_appointment(day, minutes(2025, 10, day, 10, 0), minutes(2025, 10, day, 11, 0)))
+
+        self.assertIs(self.store.find_overlap(minutes(2025, 9, 26, 10, 0), minutes(2025, 9, 26, 12, 0)), long_appt)
+
+    def test_find_overlap_excludes_id(self):
+        self.store.append(make_appointment(1, minutes(2025, 9, 26, 10, 0), minutes(2025, 9, 26, 12, 0)))
+
+        self.assertIsNone(self.store.find_overlap(minutes(2025, 9, 26, 11, 0), minutes(2025, 9, 26, 13, 0),
+                                                  exclude_id = 1))
+
+    def test_update_moves_index_entry(self):
+        appt = make_appointment(1, minutes(2025, 9, 26, 10, 0), minutes(2025, 9, 26, 12, 0))
+        self.store.append(appt)
+        self.store.update(appt, start = minutes(2025, 9, 27, 10, 0), end = minutes(2025, 9, 27, 12, 0))
+
+        self.assertIsNone(self.store.find_overlap(minutes(2025, 9, 26, 10, 0), minutes(2025, 9, 26, 12, 0)))
+        self.assertIs(self.store.find_overlap(minutes(2025, 9, 27, 11, 0), minutes(2025, 9, 27, 11, 30)), appt)
+
+    def test_remove_drops_index_entry(self):
+        first = make_appointment(1, minutes(2025, 9, 26, 10, 0), minutes(2025, 9, 26, 12, 0))
+        second = make_appointment(2, minutes(2025, 9, 26, 10, 0), minutes(2025, 9, 26, 10, 0))
+        self.store.append(first)
+        self.store.append(second)
+        self.store.remove(first)
+
+        self.assertEqual(list(self.store), [second])
+        self.assertIsNone(self.store.find_overlap(minutes(2025, 9, 26, 11, 0), minutes(2025, 9, 26, 12, 0)))
+        self.assertIs(self.store.find_overlap(minutes(2025, 9, 26, 9, 0), minutes(2025, 9, 26, 10, 0)), second)
+
+    def test_clear(self):
+        self.store.append(make_appointment(1, minutes(2025, 9, 26, 10, 0), minutes(2025, 9, 26, 12, 0)))
+        self.store.clear()
+
+        self.assertEqual(len(self.store), 0)
+        self.assertIsNone(self.store.find_overlap(minutes(2025, 9, 26, 10, 0), minutes(2025, 9, 26, 12, 0)))
+
+    def test_add_allocates_ids(self):
+        first = self.store.add("A", minutes(2025, 9, 26, 10, 0), minutes(2025, 9, 26, 11, 0), "work")
+        second = self.store.add("B", minutes(2025, 9, 26, 12, 0), minutes(2025, 9, 26, 13, 0), "work")
+
+        self.assertEqual((first.id, second.id), (1, 2))
+        self.assertIs(self.store.get(2), second)
+        self.assertIsNone(self.store.get(3))
+
+    def test_append_advances_next_id(self):
+        self.store.append(make_appointment(7, minutes(2025, 9, 26, 10, 0), minutes(2025, 9, 26, 11, 0)))
+        appt = self.store.add("B", minutes(2025, 9, 26, 12, 0), minutes(2025, 9, 26, 13, 0), "work")
+
+        self.assertEqual(appt.id, 8)
+
+    def test_append_duplicate_id(self):
+        self.store.append(make_appointment(1, minutes(2025, 9, 26, 10, 0), minutes(2025, 9, 26, 11, 0)))
+        with self.assertRaises(ValueError):
+            self.store.append(make_appointment(1, minutes(2025, 9, 27, 10, 0), minutes(2025, 9, 27, 11, 0)))
+
+    def test_delete_keeps_insertion_order(self):
+        for appt_id in range(1, 5):
+            self.store.append(make_appointment(appt_id, minutes(2025, 9, 30 - appt_id, 10, 0),
+                                               minutes(2025, 9, 30 - appt_id, 11, 0)))
+
+        deleted = self.store.delete(2)
+
+        self.assertEqual(deleted.id, 2)
+        self.assertIsNone(self.store.delete(2))
+        self.assertEqual([appt.id for appt in self.store], [1, 3, 4])
+        self.assertEqual(self.store[1].id, 3)
+        self.assertEqual(self.store[-1].id, 4)
+
+    def test_query_range(self):
+        long_appt = make_appointment(1, minutes(2025, 9, 1, 0, 0), minutes(2025, 9, 30, 0, 0))
+        before = make_appointment(2, minutes(2025, 8, 1, 10, 0), minutes(2025, 8, 1, 11, 0))
+        inside = make_appointment(3, minutes(2025, 10, 2, 10, 0), minutes(2025, 10, 2, 11, 0))
+        after = make_appointment(4, minutes(2025, 11, 1, 10, 0), minutes(2025, 11, 1, 11, 0))
+        for appt in (long_appt, before, inside, after):
+            self.store.append(appt)
+
+        self.assertEqual(self.store.query_range(minutes(2025, 9, 29, 0, 0), minutes(2025, 10, 5, 0, 0)),
+                         [long_appt, inside])
+        self.assertEqual(self.store.query_range(minutes(2025, 10, 2, 11, 0), None), [inside, after])
+        self.assertEqual(self.store.query_range(None, minutes(2025, 8, 1, 10, 0)), [before])
+        self.assertEqual(self.store.query_range(), [before, long_appt, inside, after])
+
+    def test_category_buckets(self):
+        for appt_id, category in enumerate(["work", "health", "work", "social"], start = 1):
+            self.store.append(make_appointment(appt_id, minutes(2025, 9, appt_id, 10, 0),
+                                               minutes(2025, 9, appt_id, 11, 0), category))
+
+        self.assertEqual([appt.id for appt in self.store.by_category("work")], [1, 3])
+        self.assertEqual(self.store.count("work"), 2)
+        self.assertEqual(self.store.count("general"), 0)
+        self.assertEqual(list(self.store.by_category("general")), [])
+
+        self.store.delete(1)
+        self.assertEqual([appt.id for appt in self.store.by_category("work")], [3])
+
+    def test_category_change_keeps_insertion_order(self):
+        for appt_id, category in enumerate(["work", "health", "work"], start = 1):
+            self.store.append(make_appointment(appt_id, minutes(2025, 9, appt_id, 10, 0),
+                                               minutes(2025, 9, appt_id, 11, 0), category))
+
+        self.store.update(self.store.get(2), category = "work")
+
+        self.assertEqual([appt.id for appt in self.store.by_category("work")], [1, 2, 3])
+        self.assertEqual(self.store.count("health"), 0)
+
+    def test_serialized_cache_invalidated_on_write(self):
+        appt = make_appointment(1, minutes(2025, 9, 26, 10, 0), minutes(2025, 9, 26, 12, 0))
+        self.store.append(appt)
+        version = self.store.version
+
+        first = self.store.serialized(appt, lambda a: {"title": a.title})
+        self.assertIs(self.store.serialized(appt, lambda a: {"title": "nicht benutzt"}), first)
+
+        self.store.update(appt, title = "Neu")
+        self.assertEqual(self.store.serialized(appt, lambda a: {"title": a.title}), {"title": "Neu"})
+        self.assertGreater(self.store.version, version)
+
+    @patch("store.SERIALIZED_CACHE_SIZE", 2)
+    def test_serialized_cache_is_bounded(self):
+        appts = [make_appointment(appt_id, minutes(2025, 9, appt_id, 10, 0), minutes(2025, 9, appt_id, 11, 0))
+                 for appt_id in range(1, 4)]
+        self.store.extend(appts)
+        views = [self.store.serialized(appt, lambda a: {"id": a.id}) for appt in appts]
+
+        self.assertIs(self.store.serialized(appts[2], lambda a: {"id": "neu"}), views[2])
+        self.assertEqual(self.store.serialized(appts[0], lambda a: {"id": "neu"}), {"id": "neu"})
+        self.assertIsNot(self.store.serialized(appts[1], lambda a: {"id": "neu"}), views[1])
+
+    def test_find_batch_conflicts(self):
+        existing = make_appointment(1, minutes(2025, 9, 26, 10, 0), minutes(2025, 9, 26, 12, 0))
+        self.store.append(existing)
+
+        conflicts = self.store.find_batch_conflicts([
+            (minutes(2025, 9, 26, 8, 0), minutes(2025, 9, 26, 9, 0)),
+            (minutes(2025, 9, 26, 8, 30), minutes(2025, 9, 26, 9, 30)),
+            (minutes(2025, 9, 26, 9, 45), minutes(2025, 9, 26, 10, 0)),
+            (minutes(2025, 9, 26, 11, 0), minutes(2025, 9, 26, 11, 30)),
+            (minutes(2025, 9, 26, 13, 0), minutes(2025, 9, 26, 14, 0)),
+        ])
+
+        self.assertEqual(conflicts, [None, ("batch", 0), ("store", existing), ("store", existing), None])
+
+        # a later store appointment rejects the first interval, so the second one no longer clashes with it
+        later = make_appointment(2, minutes(2025, 9, 26, 15, 20), minutes(2025, 9, 26, 15, 21))
+        self.store.append(later)
+        conflicts = self.store.find_batch_conflicts([
+            (minutes(2025, 9, 26, 15, 10), minutes(2025, 9, 26, 15, 30)),
+            (minutes(2025, 9, 26, 15, 15), minutes(2025, 9, 26, 15, 18)),
+        ])
+
+        self.assertEqual(conflicts, [("store", later), None])
+
+    def test_find_batch_conflicts_long_appointment(self):
+        long_appt = make_appointment(1, minutes(2025, 9, 1, 0, 0), minutes(2025, 9, 30, 0, 0))
+        self.store.append(long_appt)
+        self.store.append(make_appointment(2, minutes(2025, 10, 1, 0, 0), minutes(2025, 10, 1, 1, 0)))
+
+        conflicts = self.store.find_batch_conflicts([
+            (minutes(2025, 8, 31, 0, 0), minutes(2025, 8, 31, 1, 0)),
+            (minutes(2025, 9, 15, 0, 0), minutes(2025, 9, 15, 1, 0)),
+            (minutes(2025, 9, 30, 12, 0), minutes(2025, 9, 30, 13, 0)),
+        ])
+
+        self.assertEqual(conflicts, [None, ("store", long_appt), None])
+
+    def test_add_many_bulk_merges_index(self):
+        self.store.append(make_appointment(1, minutes(2025, 1, 15, 10, 0), minutes(2025, 1, 15, 11, 0)))
+        items = [("Termin", minutes(2025, 1, 1, hour, 0), minutes(2025, 1, 1, hour, 30), "work")
+                 for hour in range(23, -1, -1)]
+        items += [("Termin", minutes(2025, 2, day, 10, 0), minutes(2025, 2, day, 11, 0), "health")
+                  for day in range(1, 21)]
+
+        created = self.store.add_many(items)
+
+        self.assertEqual([appt.id for appt in created], list(range(2, 46)))
+        self.assertEqual(len(self.store), 45)
+        self.assertEqual(self.store.count("health"), 20)
+        self.assertEqual(self.store.next_id, 46)
+        starts = [appt.start for appt in self.store.query_range()]
+        self.assertEqual(starts, sorted(starts))
+        self.assertIs(self.store.find_overlap(minutes(2025, 1, 1, 5, 15), minutes(2025, 1, 1, 5, 20)), created[18])
+
+        self.store.delete(30)
+        self.store.extend([make_appointment(appt_id, minutes(2025, 3, 1, 0, 0) + appt_id * 60,
+                                            minutes(2025, 3, 1, 0, 30) + appt_id * 60, "health")
+                           for appt_id in [30] + list(range(46, 80))])
+        self.assertEqual([appt.id for appt in self.store.by_category("health")],
+                         list(range(26, 46)) + list(range(46, 80)))
+
+    def test_extend_rejects_duplicate_ids(self):
+        appts = [make_appointment(appt_id, minutes(2025, 1, appt_id, 10, 0), minutes(2025, 1, appt_id, 11, 0))
+                 for appt_id in range(1, 31)]
+        appts.append(make_appointment(5, minutes(2025, 2, 1, 10, 0), minutes(2025, 2, 1, 11, 0)))
+
+        with self.assertRaises(ValueError):
+            self.store.extend(appts)
+        self.assertEqual(len(self.store), 0)
+
+    def test_create_replace_shift(self):
+        first = self.store.create("A", minutes(2025, 9, 26, 10, 0), minutes(2025, 9, 26, 12, 0), "work")
+        second = self.store.create("B", minutes(2025, 9, 26, 13, 0), minutes(2025, 9, 26, 14, 0), "work")
+
+        with self.assertRaises(AppointmentOverlap) as contextManager:
+            self.store.create("C", minutes(2025, 9, 26, 11, 0), minutes(2025, 9, 26, 11, 30), "work")
+        self.assertIs(contextManager.exception.conflict, first)
+        with self.assertRaises(AppointmentOverlap):
+            self.store.replace(2, "B", minutes(2025, 9, 26, 12, 0), minutes(2025, 9, 26, 14, 0), "work")
+        with self.assertRaises(AppointmentNotFound):
+            self.store.replace(3, "C", minutes(2025, 9, 27, 12, 0), minutes(2025, 9, 27, 14, 0), "work")
+        with self.assertRaises(AppointmentNotFound):
+            self.store.shift(3, 60, 60)
+        with self.assertRaises(ValueError):
+            self.store.shift(2, 120, 0)
+
+        self.assertIs(self.store.shift(2, -60, -60), second)
+        self.assertEqual((second.start, second.end), (minutes(2025, 9, 26, 12, 0), minutes(2025, 9, 26, 13, 0)))
+
+    def test_recurrence_occurrences(self):
+        weekly = Appointment(1, "Sport", minutes(2025, 9, 1, 18, 0), minutes(2025, 9, 1, 19, 0), "social",
+                             Recurrence("weekly", 4, None))
+        monthly = Appointment(2, "Miete", minutes(2025, 1, 31, 9, 0), minutes(2025, 1, 31, 9, 30), "general",
+                              Recurrence("monthly", None, minutes(2025, 5, 31, 9, 0)))
+
+        self.assertEqual(weekly.last_end(), minutes(2025, 9, 22, 19, 0))
+        self.assertEqual([occurrence.start for occurrence in weekly.occurrences(minutes(2025, 9, 8, 18, 30),
+                                                                                  minutes(2025, 9, 15, 18, 0))],
+                         [minutes(2025, 9, 8, 18, 0), minutes(2025, 9, 15, 18, 0)])
+        self.assertEqual(monthly.occurrence_count(), 5)
+        self.assertEqual([occurrence.start_time.day for occurrence in monthly.occurrences()], [31, 28, 31, 30, 31])
+
+        with self.assertRaises(ValueError):
+            validate_recurrence(0, 2000, Recurrence("daily", 3, None))
+        with self.assertRaises(ValueError):
+            validate_recurrence(100, 130, Recurrence("hourly", 3, None))
+        with self.assertRaises(ValueError):
+            validate_recurrence(100, 130, Recurrence("daily", None, 50))
+
+    def test_recurring_conflicts(self):
+        weekly = self.store.create("Sport", minutes(2025, 9, 1, 18, 0), minutes(2025, 9, 1, 19, 0), "social",
+                                   Recurrence("weekly", None, minutes(2025, 12, 31, 0, 0)))
+
+        with self.assertRaises(AppointmentOverlap) as contextManager:
+            self.store.create("Arzt", minutes(2025, 10, 13, 18, 30), minutes(2025, 10, 13, 20, 0), "health")
+        self.assertIs(contextManager.exception.conflict, weekly)
+        self.store.create("Arzt", minutes(2026, 1, 5, 18, 30), minutes(2026, 1, 5, 20, 0), "health")
+        with self.assertRaises(AppointmentOverlap):
+            self.store.create("Kurs", minutes(2025, 8, 11, 18, 0), minutes(2025, 8, 11, 18, 30), "general",
+                              Recurrence("daily", 30, None))
+        self.store.create("Kurs", minutes(2025, 8, 11, 19, 30), minutes(2025, 8, 11, 20, 0), "general",
+                          Recurrence("daily", 30, None))
+
+        conflicts = self.store.check_batch([
+            ("A", minutes(2025, 9, 8, 18, 30), minutes(2025, 9, 8, 18, 45), "work", None),
+            ("B", minutes(2025, 9, 9, 8, 0), minutes(2025, 9, 9, 9, 0), "work", None),
+            ("C", minutes(2025, 9, 2, 8, 30), minutes(2025, 9, 2, 9, 30), "work", Recurrence("weekly", 3, None)),
+            ("D", minutes(2025, 9, 3, 12, 0), minutes(2025, 9, 3, 13, 0), "work", Recurrence("weekly", 3, None)),
+            ("E", minutes(2025, 9, 10, 12, 30), minutes(2025, 9, 10, 13, 0), "work", Recurrence("daily", 2, None)),
+        ])
+        self.assertEqual([conflict and conflict[0] for conflict in conflicts], ["store", None, "batch", None, "batch"])
+        self.assertIs(conflicts[0][1], weekly)
+        self.assertEqual((conflicts[2][1], conflicts[4][1]), (1, 3))
+
+    def test_query_range_expands_series(self):
+        self.store.add("Einzel", minutes(2025, 9, 2, 12, 0), minutes(2025, 9, 2, 13, 0), "work")
+        rule = self.store.add("Stand-up", minutes(2025, 9, 1, 9, 0), minutes(2025, 9, 1, 9, 15), "work",
+                              Recurrence("daily", 1000, None))
+
+        window = self.store.query_range(minutes(2025, 9, 2, 0, 0), minutes(2025, 9, 3, 23, 0))
+
+        self.assertEqual([(appt.id, appt.start) for appt in window],
+                         [(2, minutes(2025, 9, 2, 9, 0)), (1, minutes(2025, 9, 2, 12, 0)),
+                          (2, minutes(2025, 9, 3, 9, 0))])
+        self.assertEqual([appt.index for appt in window if appt.id == 2], [1, 2])
+        self.assertEqual(len(self.store), 2)
+        self.store.update(rule, recurrence = None)
+        self.assertEqual([appt.id for appt in self.store.query_range(minutes(2025, 9, 2, 0, 0), None)], [1])
+
+    def test_find_free_slots(self):
+        self.store.add("A", minutes(2025, 9, 26, 9, 0), minutes(2025, 9, 26, 10, 0), "work")
+        self.store.add("B", minutes(2025, 9, 26, 9, 30), minutes(2025, 9, 26, 11, 0), "health")
+        self.store.add("C", minutes(2025, 9, 26, 11, 31), minutes(2025, 9, 26, 12, 0), "work")
+        self.store.add("D", minutes(2025, 9, 25, 8, 0), minutes(2025, 9, 25, 8, 30), "work",
+                       Recurrence("daily", 5, None))
+        window = (minutes(2025, 9, 26, 8, 0), minutes(2025, 9, 26, 18, 0))
+
+        self.assertEqual(self.store.find_free_slots(*window, 29),
+                         [(minutes(2025, 9, 26, 11, 1), minutes(2025, 9, 26, 11, 30)),
+                          (minutes(2025, 9, 26, 12, 1), minutes(2025, 9, 26, 18, 0))])
+        self.assertEqual(self.store.find_free_slots(*window, 28)[0],
+                         (minutes(2025, 9, 26, 8, 31), minutes(2025, 9, 26, 8, 59)))
+        self.assertEqual(self.store.find_free_slots(*window, 60, categories = ["health"]),
+                         [(minutes(2025, 9, 26, 8, 0), minutes(2025, 9, 26, 9, 29)),
+                          (minutes(2025, 9, 26, 11, 1), minutes(2025, 9, 26, 18, 0))])
+        for start, end in self.store.find_free_slots(*window, 28):
+            self.assertIsNone(self.store.find_overlap(start, end))
+
+    def test_pages(self):
+        for appt_id, category in enumerate(["work", "health", "work", "social", "work"], start = 1):
+            self.store.append(make_appointment(appt_id, minutes(2025, 9, 6 - appt_id, 10, 0),
+                                               minutes(2025, 9, 6 - appt_id, 11, 0), category))
+        self.store.add("Serie", minutes(2025, 9, 1, 12, 0), minutes(2025, 9, 1, 13, 0), "work",
+                       Recurrence("daily", 3, None))
+
+        self.assertEqual([appt.id for appt in self.store.id_page(0, 4)], [1, 2, 3, 4])
+        self.assertEqual([appt.id for appt in self.store.id_page(2, 10, "work")], [3, 5, 6])
+
+        window = (minutes(2025, 9, 2, 0, 0), minutes(2025, 9, 4, 23, 0))
+        pages, after = [], None
+        while True:
+            page = self.store.query_page(*window, after, 2)
+            if not page:
+                break
+            pages.append([(appt.id, appt.start_time.day) for appt in page])
+            after = (page[-1].start, page[-1].id)
+        self.assertEqual(pages, [[(4, 2), (6, 2)], [(3, 3), (6, 3)], [(2, 4)]])
+        self.assertEqual([(appt.id, appt.start) for appt in self.store.query_page(*window, None, 10)],
+                         [(appt.id, appt.start) for appt in self.store.query_range(*window)])
+        self.assertEqual([appt.id for appt in self.store.query_page(None, None, None, 10, "work")], [5, 6, 6, 3, 6, 1])
+
+    def test_update_rejects_minutes_outside_date_range(self):
+        appt = make_appointment(1, minutes(2025, 9, 26, 10, 0), minutes(2025, 9, 26, 11, 0))
+        self.store.append(appt)
+
+        for start in (minutes(2025, 9, 26, 10, 0) + 3000000 * 1440, 10 ** 300):
+            with self.assertRaises(ValueError):
+                self.store.update(appt, start = start, end = start + 60)
+
+        self.assertEqual(appt.start, minutes(2025, 9, 26, 10, 0))
+        self.assertIs(self.store.find_overlap(minutes(2025, 9, 26, 10, 30), minutes(2025, 9, 26, 10, 45)), appt)
+        self.assertIs(self.store.delete(1), appt)
+
+    def test_incomplete_backend_cannot_be_instantiated(self):
+        class PartialStore(AppointmentBackend):
+            def get(self, appt_id):
+                return None
+
+        with self.assertRaises(TypeError):
+            PartialStore()
+
+    def test_concurrent_creates_never_double_book(self):
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        slots = [(minutes(2025, 9, 1, 0, 0) + i * 60, minutes(2025, 9, 1, 0, 45) + i * 60) for i in range(300)]
+        start = threading.Barrier(8)
+        conflicts = []
+
+        def book(worker):
+            start.wait()
+            for slot_start, slot_end in slots:
+                try:
+                    self.store.create(f"Worker {worker}", slot_start, slot_end, "work")
+                except AppointmentOverlap:
+                    conflicts.append(worker)
+
+        try:
+            threads = [threading.Thread(target = book, args = (worker,)) for worker in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        booked = sorted((appt.start, appt.end) for appt in self.store)
+        self.assertEqual(booked, slots)
+        self.assertEqual(len(conflicts), 7 * len(slots))
+        self.assertEqual(sorted(appt.id for appt in self.store), list(range(1, len(slots) + 1)))